@@ -6,6 +6,7 @@ UI.py - Configures and updates the UI
 """
 
 import tkinter as tk
+from tkinter import ttk
 import math, sys, settings, splendor
 
 class UI:
@@ -116,6 +117,14 @@ class UI:
         self.nobles_enabled = False
         self.root = root
 
+        # AI search running on a worker thread, and its progress bar
+        self.ai_turn = None
+        self.progress = None
+        # Round and turn shown in the status bar
+        self.status = None
+        # Replies searched while the human thinks
+        self.ponder = None
+
         self.clear_gui()
         self.update_gui()
 
@@ -123,6 +132,10 @@ class UI:
         self.gamestate.start_game(self)
 
     def restart(self):
+        if self.ai_turn is not None:
+            self.ai_turn.cancel()
+        if self.ponder is not None:
+            self.ponder.cancel()
         self.root.destroy()
         splendor.start()
         del self
@@ -136,6 +149,21 @@ class UI:
         self.display_info_box.config(state="disabled")
         self.display_info_box.see("end")
 
+    def show_progress(self, string):
+        """Shows a moving progress bar in the status bar while an AI is thinking"""
+        if self.progress is None:
+            self.progress = tk.Frame(self.status_bar, bg="white")
+            self.progress.grid(sticky="e", row=0, column=1)
+            tk.Label(self.progress, bg="white", padx=5, text=string).grid(row=0, column=0)
+            bar = ttk.Progressbar(self.progress, mode="indeterminate", length=120)
+            bar.grid(row=0, column=1)
+            bar.start(10)
+
+    def hide_progress(self):
+        if self.progress is not None:
+            self.progress.destroy()
+            self.progress = None
+
     def pop_token(self, gemType):
         """Removes token from temporary pool when using gold tokens"""
         gem_index = settings.RESOURCE_COLOURS.index(gemType)
@@ -230,7 +258,7 @@ class UI:
             string = string + "."
             self.display_message(
                 "> Player " + str(current_player + 1) + " picked up:" + string)
-            gamestate.increment_turn(self)
+            gamestate.end_turn(self)
 
     def reset_token_selection(self, gamestate):
         """Removes all tokens from selection stack"""
@@ -244,7 +272,7 @@ class UI:
         if len(gamestate.players[gamestate.turn % len(gamestate.players)].reservations) <= 2:
             gamestate.reserve_card((gamestate.turn % len(
                 gamestate.players)), gamestate.development_cards[1][level], index, self)
-            gamestate.increment_turn(self)
+            gamestate.end_turn(self)
         else:
             self.display_message(
                 "[Error] Cannot complete action. You can only reserve up to three cards at once.")
@@ -600,9 +628,12 @@ class UI:
         round_count = math.floor(
             self.gamestate.turn / len(self.gamestate.players)) + 1
 
-        # draw status
-        tk.Label(self.status_bar, bg="white", padx=5, text="Round " + str(round_count) +
-                 ", Turn " + str(current_turn)).grid(sticky="e", row=0, column=0)
+        # draw status, replacing the previous turn's
+        if self.status is not None:
+            self.status.destroy()
+        self.status = tk.Label(self.status_bar, bg="white", padx=5, text="Round " + str(round_count) +
+                               ", Turn " + str(current_turn))
+        self.status.grid(sticky="e", row=0, column=0)
 
         self.redraw_top()
         self.redraw_centre()
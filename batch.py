@@ -0,0 +1,316 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+batch.py - Plays many standard AI games in lockstep as arrays, for statistical studies
+"""
+
+import settings, catalog, moves
+import numpy as np
+# Same board layout as compact gamestates
+from compact import EMPTY, TIERS, FLOP_SIZE, DECK_SIZES, MAX_RESERVATIONS, MAX_NOBLES
+
+# Turn data codes, index 0 is a turn with no entry
+ACTIONS = [None, "B1", "B2", "B3", "T2", "T3", "RB", "E"]
+B1, T2, T3, RB, E = 1, 4, 5, 6, 7
+
+# Risk data columns, as in GameState.GameSummary
+R1, R5 = 0, 4
+RISKS = ["R1", "R2", "R3", "R4", "R5"]
+
+_tables = None
+
+
+def tables():
+    """Card and noble attributes indexed by id, with an empty last row so that EMPTY ids index it"""
+    global _tables
+
+    if _tables is None:
+        card_catalog = catalog.load()
+        cards = card_catalog.cards
+        nobles = card_catalog.nobles
+        _tables = {
+            "cost": np.array([card.purchaseCost for card in cards] + [[0] * 5]),
+            "gem": np.array([card.gem for card in cards] + [0]),
+            "points": np.array([card.pointValue for card in cards] + [0]),
+            "level": np.array([card.level for card in cards] + [1]),
+            "requirement": np.array([noble.prerequisites for noble in nobles] + [[0] * 5]),
+            "tier_ids": card_catalog.tier_ids,
+            "noble_ids": card_catalog.noble_ids,
+        }
+    return _tables
+
+
+def remove_at(rows, positions):
+    """Remove one entry from each row, shifting later entries left and padding with EMPTY"""
+    width = rows.shape[1]
+    index = np.arange(width)[None, :]
+    source = np.where(index >= positions[:, None], index + 1, index)
+    padded = np.concatenate([rows, np.full((len(rows), 1), EMPTY, rows.dtype)], axis=1)
+    return np.take_along_axis(padded, source, axis=1)
+
+
+class BatchSimulation:
+    """N independent games of standard AI players, advanced one turn at a time together"""
+
+    def __init__(self, n_games, n_players, seed=None, max_rounds=200):
+        self.n_games = n_games
+        self.n_players = n_players
+        self.max_rounds = max_rounds
+        self.rng = np.random.default_rng(seed)
+        t = tables()
+        N, P = n_games, n_players
+
+        # Shuffle each game's decks and deal the board, slot 0 of each tier is face down
+        self.decks = np.full((N, TIERS, max(DECK_SIZES)), EMPTY)
+        self.deck_size = np.zeros((N, TIERS), dtype=int)
+        self.board = np.full((N, TIERS, FLOP_SIZE), EMPTY)
+        for tier, ids in enumerate(t["tier_ids"]):
+            deck = self.rng.permuted(np.tile(ids, (N, 1)), axis=1)
+            self.board[:, tier] = deck[:, :FLOP_SIZE]
+            self.decks[:, tier, :len(ids) - FLOP_SIZE] = deck[:, FLOP_SIZE:]
+            self.deck_size[:, tier] = len(ids) - FLOP_SIZE
+        self.deck_top = np.zeros((N, TIERS), dtype=int)
+
+        # Colours dealt so far, for the colour probabilities
+        self.dealt = np.zeros((N, 5), dtype=int)
+        for gem in range(5):
+            self.dealt[:, gem] = (t["gem"][self.board] == gem).sum(axis=(1, 2))
+
+        nobles = self.rng.permuted(np.tile(t["noble_ids"], (N, 1)), axis=1)
+        self.nobles = np.full((N, MAX_NOBLES), EMPTY)
+        n_nobles = min(P + 1, MAX_NOBLES)
+        self.nobles[:, :n_nobles] = nobles[:, :n_nobles]
+
+        start = {2: 4, 3: 5}.get(P, 7)
+        self.token_pool = np.tile([start] * 5 + [5], (N, 1))
+        self.tokens = np.zeros((N, P, 6), dtype=int)
+        self.bonuses = np.zeros((N, P, 5), dtype=int)
+        self.points = np.zeros((N, P), dtype=int)
+        self.n_cards = np.zeros((N, P), dtype=int)
+        self.reservations = np.full((N, P, MAX_RESERVATIONS), EMPTY)
+
+        # Game summaries
+        self.turn = 0
+        self.active = np.ones(N, dtype=bool)
+        self.completed = np.zeros(N, dtype=bool)
+        self.rounds = np.zeros(N, dtype=int)
+        self.errors = np.zeros(N, dtype=int)
+        self.winning_player = np.zeros(N, dtype=int)
+        self.actions = np.zeros((N, P, max_rounds + 1), dtype=np.int8)
+        self.risks = np.zeros((N, P, len(RISKS)), dtype=int)
+
+    def run(self):
+        """Play every game to completion"""
+        while self.active.any():
+            self.step()
+        return self
+
+    def step(self):
+        """Play one turn of every active game"""
+        t = tables()
+        N = self.n_games
+        g = np.arange(N)
+        p = self.turn % self.n_players
+        round_number = self.turn // self.n_players + 1
+        act = self.active
+
+        tokens = self.tokens[:, p]
+        bonuses = self.bonuses[:, p]
+        reservations = self.reservations[:, p]
+        token_count = tokens.sum(axis=1)
+
+        # Step 1 - Noble weights, random before the first card is bought
+        requirement = t["requirement"][self.nobles]
+        distance = np.sqrt(((requirement - bonuses[:, None, :]) ** 2).sum(axis=2))
+        skew = self.rng.gamma(1, settings.NOBLE_WEIGHT_FACTOR, distance.shape)
+        w_noble = np.where((self.n_cards[:, p] == 0)[:, None], skew, 1/(1+distance))
+        w_noble *= self.nobles != EMPTY
+        wcg = np.einsum('nk,nkg->ng', w_noble, requirement > 0)
+
+        # Step 2 - Card weights for the face up cards then the player's reservations
+        remaining = 18 - self.dealt
+        pc = remaining / remaining.sum(axis=1, keepdims=True) * 100
+        candidates = np.concatenate([self.board[:, :, 1:].reshape(N, -1), reservations], axis=1)
+        valid = candidates != EMPTY
+        cost = t["cost"][candidates]
+        gem = t["gem"][candidates]
+        r = bonuses + tokens[:, :5]
+        d = np.sqrt(((cost - r[:, None, :]) ** 2).sum(axis=2) + tokens[:, None, 5] ** 2)
+        w = t["points"][candidates] * 0.2 + np.take_along_axis(wcg, gem, axis=1) + \
+            d * np.take_along_axis(pc, gem, axis=1)
+        w = np.where(valid, w, 0)
+
+        # Cards are affordable if gold covers any shortfall
+        effective_cost = np.maximum(cost - bonuses[:, None, :], 0)
+        shortfall = np.maximum(effective_cost - tokens[:, None, :5], 0).sum(axis=2)
+        affordable = valid & (shortfall <= tokens[:, None, 5])
+
+        # Step 3 - Standard AI decision tree
+        n_faceup = TIERS * (FLOP_SIZE - 1)
+        affordable_cards = affordable[:, :n_faceup]
+        affordable_reservations = affordable[:, n_faceup:]
+        any_card = affordable_cards.any(axis=1)
+        any_reservation = affordable_reservations.any(axis=1)
+        best_card = np.where(any_card, np.where(affordable_cards, w[:, :n_faceup], -np.inf).max(axis=1), 0)
+        best_reservation = np.where(any_reservation, np.where(
+            affordable_reservations, w[:, n_faceup:], -np.inf).max(axis=1), 0)
+
+        buy_reservation = act & any_reservation & (best_reservation >= best_card)
+        buy_card = act & ~buy_reservation & any_card
+        other = act & ~buy_reservation & ~any_card
+        take = other & (token_count < 10)
+        take_tokens = take & (self.token_pool[:, :5].max(axis=1) > 0)
+        n_reserved = (reservations != EMPTY).sum(axis=1)
+        faceup = valid[:, :n_faceup]
+        reserve = other & ~take & (n_reserved < MAX_RESERVATIONS) & faceup.any(axis=1)
+        stuck = other & ~take & ~reserve
+
+        # No tokens left to pick up, or no moves at all
+        self.errors += (take & ~take_tokens) | stuck
+        self.actions[stuck, p, round_number] = E
+
+        # Action - Buy development card, or a reservation
+        choice = np.argmax(np.where(affordable_cards, w[:, :n_faceup], -np.inf), axis=1)
+        self.buy(buy_card, p, round_number, candidates[g, choice], effective_cost[g, choice])
+        self.remove_from_board(buy_card, choice // (FLOP_SIZE - 1), choice % (FLOP_SIZE - 1) + 1)
+
+        choice = np.argmax(np.where(affordable_reservations, w[:, n_faceup:], -np.inf), axis=1)
+        self.buy(buy_reservation, p, round_number, reservations[g, choice],
+                 effective_cost[g, n_faceup + choice])
+        self.reservations[buy_reservation, p] = remove_at(
+            reservations[buy_reservation], choice[buy_reservation])
+
+        # Action - Reserve a card, with a full hand so no gold token is taken
+        choice = np.argmax(np.where(faceup, w[:, :n_faceup], -np.inf), axis=1)
+        self.reservations[reserve, p, n_reserved[reserve]] = candidates[reserve, choice[reserve]]
+        self.remove_from_board(reserve, choice // (FLOP_SIZE - 1), choice % (FLOP_SIZE - 1) + 1)
+        self.actions[reserve, p, round_number] = RB
+        self.risks[reserve, p, R1] += 1
+
+        # Action - Pick up tokens, weighted by the cards in play and reserved
+        per_level = cost / t["level"][candidates][:, :, None]
+        w_token = np.einsum('nc,ncg->ng', w, per_level)
+        self.take_tokens(take_tokens, p, round_number, w_token, token_count)
+
+        # Noble visits, the first noble whose prerequisites are met
+        eligible = (self.nobles != EMPTY) & (self.bonuses[:, p, None, :] >= requirement).all(axis=2)
+        visited = act & eligible.any(axis=1)
+        self.points[visited, p] += 3
+        self.nobles[visited] = remove_at(self.nobles[visited], np.argmax(eligible, axis=1)[visited])
+
+        self.end_turn()
+
+    def buy(self, mask, p, round_number, cards, effective_cost):
+        """Pay for and add cards to the hands of the current player in masked games"""
+        t = tables()
+        tokens = self.tokens[mask, p]
+        paid = np.minimum(effective_cost[mask], tokens[:, :5])
+        gold = (effective_cost[mask] - paid).sum(axis=1)
+        tokens[:, :5] -= paid
+        tokens[:, 5] -= gold
+        self.tokens[mask, p] = tokens
+        self.token_pool[mask, :5] += paid
+        self.token_pool[mask, 5] += gold
+
+        cards = cards[mask]
+        games = np.flatnonzero(mask)
+        np.add.at(self.bonuses, (games, p, t["gem"][cards]), 1)
+        self.points[mask, p] += t["points"][cards]
+        self.n_cards[mask, p] += 1
+        self.actions[mask, p, round_number] = B1 - 1 + t["level"][cards]
+
+    def remove_from_board(self, mask, tier, slot):
+        """Take cards off the board in masked games, redealing from the deck or closing the gap"""
+        t = tables()
+        games = np.flatnonzero(mask)
+        tier = tier[mask]
+        slot = slot[mask]
+        refill = self.deck_top[games, tier] < self.deck_size[games, tier]
+
+        # Redeal into the same slot
+        g, k = games[refill], tier[refill]
+        card = self.decks[g, k, self.deck_top[g, k]]
+        self.board[g, k, slot[refill]] = card
+        self.deck_top[g, k] += 1
+        np.add.at(self.dealt, (g, t["gem"][card]), 1)
+
+        # The deck is empty, so the flop shrinks
+        g, k = games[~refill], tier[~refill]
+        self.board[g, k] = remove_at(self.board[g, k], slot[~refill])
+
+    def take_tokens(self, mask, p, round_number, w_token, token_count):
+        """Pick up tokens as calculate_token_selection does, in masked games"""
+        pool = self.token_pool[:, :5]
+        available = pool > 0
+        n_available = available.sum(axis=1)
+        capacity = 10 - token_count
+
+        # Determine if favoured gem type exists
+        n = np.maximum(n_available, 1)
+        mean = (w_token * available).sum(axis=1) / n
+        std = np.sqrt((((w_token - mean[:, None]) * available) ** 2).sum(axis=1) / n)
+        best_gem = np.argmax(np.where(available, w_token, -np.inf), axis=1)
+        best = np.take_along_axis(w_token, best_gem[:, None], axis=1)[:, 0]
+        favoured = (n_available >= 2) & (best >= mean + 1.75 * std)
+        double = mask & favoured & (np.take_along_axis(pool, best_gem[:, None], axis=1)[:, 0] >= 4)
+
+        # Otherwise the best legal pick of different gems
+        legal = np.all(moves.TOKEN_PICKS[None, :, :5] <= pool[:, None, :], axis=2) & \
+            (moves.TOKEN_PICK_SIZES[None, :] <= capacity[:, None]) & ~moves.TOKEN_PICK_DOUBLES
+        scores = np.where(legal, np.round(w_token @ moves.TOKEN_PICKS[:, :5].T, 9), -np.inf)
+        pick = np.argmax(scores, axis=1)
+        stack = np.where(legal.any(axis=1)[:, None], moves.TOKEN_PICKS[pick], 0)
+
+        two = double & (token_count <= 8)
+        pick = np.where(two, np.array(moves.DOUBLE_PICK_ROWS)[best_gem],
+                        np.array(moves.SINGLE_PICK_ROWS)[best_gem])
+        stack = np.where(double[:, None], moves.TOKEN_PICKS[pick], stack)
+        stack *= mask[:, None]
+
+        self.risks[double, p, R5] += 1
+        self.actions[two, p, round_number] = T2
+        three = mask & ~double & (n_available >= 2) & (token_count <= 7)
+        self.actions[three, p, round_number] = T3
+
+        self.token_pool -= stack
+        self.tokens[:, p] += stack
+
+    def end_turn(self):
+        """Advance the turn and finish games that are won, stuck or too long"""
+        self.turn += 1
+        act = self.active
+        rounds = self.turn // self.n_players
+
+        if self.turn % self.n_players == 0:
+            won = act & (self.points.max(axis=1) >= settings.VICTORY_POINTS_REQUIRED)
+            # Ties go to the player with fewest cards
+            best = self.points == self.points.max(axis=1, keepdims=True)
+            tie_break = np.where(best, self.n_cards, np.iinfo(int).max)
+            self.winning_player[won] = np.argmin(tie_break, axis=1)[won] + 1
+            self.completed |= won
+            self.rounds[won] = rounds
+            act &= ~won
+
+        act &= self.errors < 50
+        if rounds >= self.max_rounds:
+            act[:] = False
+
+    def round_count(self):
+        """Round lengths of completed games, as graph_round_count takes them"""
+        return self.rounds[self.completed].tolist()
+
+    def turn_data(self, player_id=0):
+        """(round, action) pairs of a player in completed games, as graph_turn_distribution takes them"""
+        actions = self.actions[self.completed, player_id]
+        games, rounds = np.nonzero(actions)
+        return [(int(round), ACTIONS[action]) for round, action in zip(rounds, actions[games, rounds])]
+
+    def risk_count(self, player_id=0):
+        """Total risks taken by a player in completed games"""
+        return int(self.risks[self.completed, player_id].sum())
+
+    def error_count(self):
+        """Total AI errors in completed games"""
+        return int(self.errors[self.completed].sum())
+
@@ -0,0 +1,158 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+book.py - Opening book of token picks for the first rounds, built from self-play
+"""
+
+import os
+import settings, moves, mcts, catalog, gamestate, simulation
+import numpy as np
+
+# A position is only booked once seen this often, every time with the same move
+MIN_SAMPLES = 3
+# Recorded for moves other than token picks, which are never booked
+OTHER = -1
+
+_book = None
+
+
+def signature(gamestate):
+    """Key of the features the first rounds' token picks depend on
+
+    AI type, player count, seat and round, the mover's tokens and the token pool,
+    the three gems most in demand on the board and the gem nobles most require,
+    packed into one 64 bit integer.
+    """
+    n_players = len(gamestate.players)
+    seat = gamestate.turn % n_players
+    player = gamestate.players[seat]
+
+    faceup = [card for flop in gamestate.development_cards[1] for card in flop[1:]]
+    demand = catalog.card_rows(faceup)[:, catalog.ROW_COST_PER_LEVEL].sum(axis=0)
+    gems = np.argsort(-demand, kind="stable")[:3].tolist()
+    nobles = np.sum([noble.prerequisites for noble in gamestate.noble_cards[1]], axis=0)
+
+    fields = [(gamestate.ai_type, 8), (n_players, 5), (seat, 4), (gamestate.turn // n_players, 8)] + \
+        [(count, 11) for count in player.tokens] + [(count, 8) for count in gamestate.token_pool] + \
+        [(gem, 5) for gem in gems] + [(int(np.argmax(nobles)), 5)]
+    key = 0
+    for value, base in fields:
+        key = key * base + value
+    return key
+
+
+def in_book(gamestate):
+    """Check if the position is early enough, with nothing to buy, for the book to answer"""
+    if gamestate.turn >= settings.OPENING_BOOK_ROUNDS * len(gamestate.players):
+        return None
+    actions = moves.legal_actions(gamestate)
+    if any(action in mcts.BUY_ACTIONS for action in actions):
+        return None
+    return actions
+
+
+def load(path=None):
+    """The process's opening book, memory mapped on first use
+
+    The book is a 2 x n array of sorted keys above their token pick actions. Without
+    a book file the book is empty.
+    """
+    global _book
+
+    if _book is None:
+        if path is None:
+            path = settings.OPENING_BOOK_PATH
+        if os.path.exists(path):
+            _book = np.load(path, mmap_mode="r")
+        else:
+            _book = np.zeros((2, 0), dtype=np.uint64)
+    return _book
+
+
+def lookup(gamestate, book=None):
+    """Book move for the player to move, or None"""
+    actions = in_book(gamestate)
+    if actions is None:
+        return None
+    if book is None:
+        book = load()
+
+    key = signature(gamestate)
+    keys = book[0]
+    i = int(np.searchsorted(keys, np.uint64(key)))
+    if i < len(keys) and int(keys[i]) == key:
+        action = int(book[1][i])
+        if action in actions:
+            return moves.ACTIONS[action]
+    return None
+
+
+def build(n_games, ai_types=None, player_counts=None, seed=0, path=None):
+    """Play the first rounds of n self-play games per AI type and player count, and save
+    the agreed token picks
+
+    AI types default to those that consult the book, and player counts to those of
+    simulations and of games against a human.
+    Returns the book, which is also written to path.
+    """
+    if ai_types is None:
+        ai_types = settings.OPENING_BOOK_AI_TYPES
+    if player_counts is None:
+        player_counts = sorted({settings.NUMBER_OF_AI_PLAYERS,
+                                settings.NUMBER_OF_PLAYERS + settings.NUMBER_OF_AI_PLAYERS})
+    if path is None:
+        path = settings.OPENING_BOOK_PATH
+
+    # Step 1 - Count the moves made in each position, with the book itself out of play
+    samples = {}
+    use_book = settings.OPENING_BOOK
+    settings.OPENING_BOOK = False
+    try:
+        for ai_type in ai_types:
+            for n_players in player_counts:
+                for index in range(n_games):
+                    record_game(ai_type, n_players, simulation.game_seed(seed, index), samples)
+    finally:
+        settings.OPENING_BOOK = use_book
+
+    # Step 2 - Keep token picks every game agrees on
+    entries = []
+    for key, counts in samples.items():
+        if len(counts) == 1:
+            action, total = next(iter(counts.items()))
+            if action != OTHER and total >= MIN_SAMPLES:
+                entries.append((key, action))
+    entries.sort()
+
+    # Step 3 - Save as sorted keys above their actions, ready to be memory mapped
+    book = np.array([[key for key, _ in entries], [action for _, action in entries]],
+                    dtype=np.uint64).reshape(2, len(entries))
+    np.save(path, book)
+    return book
+
+
+def record_game(ai_type, n_players, seed, samples):
+    """Play the book's rounds of one game, counting the move made in each bookable position"""
+    game = gamestate.GameState(0, n_players, ai_type, seed)
+    while not game.game_over and game.turn < settings.OPENING_BOOK_ROUNDS * n_players:
+        game.refresh_weights()
+        player = game.players[game.turn % n_players]
+        key = signature(game) if in_book(game) is not None else None
+        tokens = list(player.tokens)
+        held = (len(player.cards), len(player.reservations))
+
+        player.evaluation(game, None)
+        if key is None:
+            continue
+
+        action = OTHER
+        if held == (len(player.cards), len(player.reservations)):
+            stack = tuple(after - before for after, before in zip(player.tokens, tokens))
+            action = TAKE_ACTIONS.get(stack, OTHER)
+        counts = samples.setdefault(key, {})
+        counts[action] = counts.get(action, 0) + 1
+
+
+# Token pick actions by the change they make to a player's tokens
+TAKE_ACTIONS = {moves.ACTIONS[action][1]: action for action, _ in moves.TAKE_DIFFERENT[3] + moves.TAKE_DOUBLE}
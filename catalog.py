@@ -0,0 +1,191 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+catalog.py - Loads every development and noble card once per process
+"""
+
+import csv, math, settings
+import numpy as np
+
+_catalog = None
+
+# Attribute matrices of recently seen lists of cards, keyed by their ids
+_row_cache = {}
+ROW_CACHE_SIZE = 4096
+
+# Distance to each noble and whether it is met, keyed by noble id and a player's bonuses
+_noble_cache = {}
+NOBLE_CACHE_SIZE = 65536
+
+
+class DevelopmentCard:
+    __slots__ = ('id', 'level', 'gemType', 'gem', 'pointValue', 'purchaseCost', 'cost')
+
+    def __init__(self, level, gemType, pointValue, purchaseCost, id=None):
+        self.id = id
+        self.level = level
+        self.gemType = gemType
+        self.gem = settings.RESOURCE_COLOURS.index(gemType)
+        self.pointValue = pointValue
+        self.purchaseCost = tuple(purchaseCost)
+        # Cost padded with a zero gold entry to line up with token vectors
+        self.cost = np.array(self.purchaseCost + (0,))
+        self.cost.flags.writeable = False
+
+    def __reduce__(self):
+        # Catalog cards are unpickled as the records of the receiving process
+        if self.id is None:
+            return (DevelopmentCard, (self.level, self.gemType, self.pointValue, self.purchaseCost))
+        return (development_card, (self.id,))
+
+    def __str__(self):
+        return "Development Card (Level: {}, Gem Type: {}, Point Value: {}, Cost: {})".format(
+            self.level,
+            self.gemType,
+            self.pointValue,
+            self.purchaseCost
+        )
+
+
+class NobleCard:
+    __slots__ = ('id', 'prerequisites', 'requirement')
+
+    def __init__(self, prerequisites, id=None):
+        self.id = id
+        self.prerequisites = tuple(prerequisites)
+        # Prerequisites padded with a zero gold entry to line up with wealth vectors
+        self.requirement = np.array(self.prerequisites + (0,))
+        self.requirement.flags.writeable = False
+
+    def __reduce__(self):
+        if self.id is None:
+            return (NobleCard, (self.prerequisites,))
+        return (noble_card, (self.id,))
+
+    def __str__(self):
+        return "Noble Card (Prerequisites: {})".format(self.prerequisites)
+
+
+class Catalog:
+    """Immutable set of all cards, indexed by integer id"""
+
+    def __init__(self, cards, nobles):
+        self.cards = tuple(cards)
+        self.nobles = tuple(nobles)
+
+        # Card ids of each development card tier
+        self.tier_ids = tuple(
+            np.array([card.id for card in self.cards if card.level == level])
+            for level in (1, 2, 3))
+        self.noble_ids = np.arange(len(self.nobles))
+
+        # Card attributes as rows indexed by id, for batched weight calculations
+        self.card_rows = np.array([card_row(card) for card in self.cards], dtype=float)
+        self.card_rows.flags.writeable = False
+
+    def card(self, id):
+        return self.cards[id]
+
+    def noble(self, id):
+        return self.nobles[id]
+
+
+# Columns of card rows - cost, point value, a one-hot gem type, cost per level and the
+# squared length of the cost
+ROW_COST = slice(0, 6)
+ROW_POINTS = 6
+ROW_GEM = slice(7, 12)
+ROW_COST_PER_LEVEL = slice(12, 17)
+ROW_COST_SQUARED = 17
+ROW_WIDTH = 18
+
+
+def card_row(card):
+    gem = [0, 0, 0, 0, 0]
+    gem[card.gem] = 1
+    return list(card.cost) + [card.pointValue] + gem + \
+        [cost / card.level for cost in card.purchaseCost] + \
+        [sum(cost * cost for cost in card.purchaseCost)]
+
+
+def card_rows(cards):
+    """Returns the attribute rows of a list of cards as one matrix"""
+    ids = tuple([card.id for card in cards])
+    if None in ids:
+        # Cards made outside the catalog, e.g. in tests
+        return np.array([card_row(card) for card in cards], dtype=float).reshape(-1, ROW_WIDTH)
+
+    # The board changes at most once a turn, so the same rows are gathered repeatedly
+    rows = _row_cache.get(ids)
+    if rows is None:
+        if len(_row_cache) >= ROW_CACHE_SIZE:
+            _row_cache.clear()
+        rows = load().card_rows[list(ids)]
+        rows.flags.writeable = False
+        _row_cache[ids] = rows
+    return rows
+
+
+def noble_distance(prerequisites, bonuses):
+    return (math.sqrt(sum((x - y) ** 2 for x, y in zip(prerequisites, bonuses))),
+            all(x <= y for x, y in zip(prerequisites, bonuses)))
+
+
+def noble_proximity(noble, bonuses):
+    """Returns the distance from a player's bonuses to a noble's prerequisites, and
+    whether they are met"""
+    if noble.id is None:
+        # Nobles made outside the catalog, e.g. in tests
+        return noble_distance(noble.prerequisites, bonuses)
+
+    # Bonuses only change when a card is bought, so every player asks the same
+    # questions turn after turn, and game after game
+    key = (noble.id, tuple(bonuses))
+    proximity = _noble_cache.get(key)
+    if proximity is None:
+        if len(_noble_cache) >= NOBLE_CACHE_SIZE:
+            _noble_cache.clear()
+        proximity = noble_distance(noble.prerequisites, bonuses)
+        _noble_cache[key] = proximity
+    return proximity
+
+
+def development_card(id):
+    return load().card(id)
+
+
+def noble_card(id):
+    return load().noble(id)
+
+
+def load():
+    """Return the process-wide catalog, parsing the data files on first use"""
+    global _catalog
+
+    if _catalog is None:
+        cards = []
+        with open('data/development_cards.csv', mode='r') as file:
+            csvFile = csv.reader(file)
+            next(csvFile)
+            for lines in csvFile:
+                level = int(lines[0])
+                gemType = lines[1]
+                pointValue = int(lines[2])
+                purchaseCost = [int(lines[3]), int(lines[4]), int(
+                    lines[5]), int(lines[6]), int(lines[7])]
+                cards.append(DevelopmentCard(
+                    level, gemType, pointValue, purchaseCost, len(cards)))
+
+        nobles = []
+        with open('data/noble_cards.csv', mode='r') as file:
+            csvFile = csv.reader(file)
+            next(csvFile)
+            for lines in csvFile:
+                prerequisites = [int(lines[0]), int(lines[1]), int(
+                    lines[2]), int(lines[3]), int(lines[4])]
+                nobles.append(NobleCard(prerequisites, len(nobles)))
+
+        _catalog = Catalog(cards, nobles)
+
+    return _catalog
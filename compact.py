@@ -0,0 +1,237 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+compact.py - Fixed size array representation of a gamestate for analysis and search
+"""
+
+import catalog, gamestate
+import player as p
+import numpy as np
+
+# Empty slot marker for card id fields
+EMPTY = -1
+
+# Board layout, mirrors gamestate.development_cards
+TIERS = 3
+FLOP_SIZE = 5
+DECK_SIZES = (40, 30, 20)
+MAX_RESERVATIONS = 3
+MAX_NOBLES = 5
+N_CARDS = sum(DECK_SIZES)
+N_NOBLES = 10
+
+# Card locations at or above this are owned, by the player OWNED + id. Below it they
+# are positions in a deck, top card first
+OWNED = 64
+
+_dtypes = {}
+
+
+def state_dtype(n_players):
+    """Record layout of a compact gamestate for a given number of players"""
+    if n_players not in _dtypes:
+        _dtypes[n_players] = np.dtype([
+            ('token_pool', np.int8, (6,)),
+            ('tokens', np.int8, (n_players, 6)),
+            ('bonuses', np.int8, (n_players, 5)),
+            ('points', np.int8, (n_players,)),
+            ('reservations', np.int8, (n_players, MAX_RESERVATIONS)),
+            ('board', np.int8, (TIERS, FLOP_SIZE)),
+            ('nobles', np.int8, (MAX_NOBLES,)),
+            # Location of every card and noble by id, EMPTY if on the board or reserved
+            ('cards', np.int8, (N_CARDS,)),
+            # Place of every card in the order cards were dealt, most recent first, EMPTY if in a deck
+            ('dealt', np.int8, (N_CARDS,)),
+            ('noble_owners', np.int8, (N_NOBLES,)),
+            ('turn', np.int16),
+            ('final_round', np.bool_),
+            ('noble_pending', np.bool_),
+            ('ai_type', np.int8),
+            ('humans', np.int8),
+        ])
+    return _dtypes[n_players]
+
+
+def empty_states(n, n_players):
+    """Allocate a contiguous block of n compact gamestates"""
+    states = np.zeros(n, dtype=state_dtype(n_players))
+    for field in ('reservations', 'board', 'nobles', 'cards', 'dealt', 'noble_owners'):
+        states[field] = EMPTY
+    return states
+
+
+class CompactState:
+    """A gamestate held in a single fixed-dtype record of a few hundred bytes"""
+    __slots__ = ('data',)
+
+    def __init__(self, n_players, data=None):
+        if data is None:
+            data = empty_states(1, n_players)[0]
+        self.data = data
+
+    @classmethod
+    def from_gamestate(cls, gamestate):
+        """Pack the persistent parts of a GameState into a compact record"""
+        state = cls(len(gamestate.players))
+        data = state.data
+
+        data['token_pool'] = gamestate.token_pool[:6]
+        for i, player in enumerate(gamestate.players):
+            data['tokens'][i] = player.tokens[:6]
+            data['bonuses'][i] = player.count_wealth()[:5]
+            data['points'][i] = player.score()
+            for j, card in enumerate(player.reservations):
+                data['reservations'][i, j] = card.id
+            for card in player.cards:
+                data['cards'][card.id] = OWNED + i
+            for noble in player.nobles:
+                data['noble_owners'][noble.id] = i
+
+        for tier in range(TIERS):
+            flop = gamestate.development_cards[1][tier]
+            for slot, card in enumerate(flop):
+                data['board'][tier, slot] = card.id
+            for position, card in enumerate(gamestate.development_cards[0][tier]):
+                data['cards'][card.id] = position
+
+        for position, card in enumerate(gamestate.dealt):
+            data['dealt'][card.id] = position
+
+        for i, noble in enumerate(gamestate.noble_cards[1]):
+            data['nobles'][i] = noble.id
+
+        data['turn'] = gamestate.turn
+        data['final_round'] = gamestate.final_round
+        data['noble_pending'] = gamestate.noble_pending
+        data['ai_type'] = gamestate.ai_type
+        data['humans'] = sum(not isinstance(player, p.AI) for player in gamestate.players)
+        return state
+
+    def to_gamestate(self, rng=None):
+        """Unpack into a GameState ready for search, with fresh weights and session log
+
+        Cards are the shared catalog records. Players' cards and nobles are in id order,
+        and the cards dealt so far are in the order they were dealt.
+        """
+        card_catalog = catalog.load()
+        data = self.data
+        cards = data['cards']
+        game = gamestate.GameState.__new__(gamestate.GameState)
+        if rng is None:
+            rng = np.random.default_rng()
+        game.rng = rng
+        game.seed = None
+        game.ai_type = int(data['ai_type'])
+        game.board_version = 0
+        game.weights_turn = None
+
+        # Step 1 - Players, in seat order with the humans first as in GameState
+        game.players = []
+        for i in range(self.n_players):
+            if i < data['humans']:
+                game.add_human_player(i)
+            else:
+                game.add_ai_player(i, game.ai_type)
+            player = game.players[i]
+            player.tokens = self.tokens[i].tolist()
+            player.reservations = [card_catalog.card(id) for id in self.reservations[i] if id != EMPTY]
+            for id in np.flatnonzero(cards == OWNED + i):
+                player.add_card(card_catalog.card(id))
+            for id in np.flatnonzero(data['noble_owners'] == i):
+                player.add_noble(card_catalog.noble(id))
+
+        # Step 2 - Board, decks and nobles
+        flops = [[card_catalog.card(id) for id in self.board[tier] if id != EMPTY] for tier in range(TIERS)]
+        decks = [[card_catalog.card(id) for id in self.deck(tier)] for tier in range(TIERS)]
+        game.development_cards = [decks, flops]
+        faceup = [card_catalog.noble(id) for id in self.nobles if id != EMPTY]
+        unseen = [noble for noble in card_catalog.nobles
+                  if noble not in faceup and data['noble_owners'][noble.id] == EMPTY]
+        game.noble_cards = [unseen, faceup]
+        dealt = np.flatnonzero(data['dealt'] != EMPTY)
+        game.dealt = [card_catalog.card(id) for id in dealt[np.argsort(data['dealt'][dealt])]]
+
+        # Step 3 - Turn and phase
+        game.token_pool = self.token_pool.tolist()
+        game.temp_pool = [0, 0, 0, 0, 0, 0]
+        game.skipNobleCheck = False
+        game.turn = self.turn
+        game.final_round = self.final_round
+        game.game_over = False
+        game.noble_pending = bool(data['noble_pending'])
+        game.move_stack = []
+        game.game_summary = game.GameSummary(game)
+        game.round_number = game.turn // self.n_players + 1
+        return game
+
+    @classmethod
+    def from_bytes(cls, n_players, buffer):
+        """Rebuild a compact gamestate from its raw bytes"""
+        data = np.frombuffer(buffer, dtype=state_dtype(n_players))[0].copy()
+        return cls(n_players, data)
+
+    def __reduce__(self):
+        # Pickled as the raw bytes, leaving out the record layout
+        return (CompactState.from_bytes, (self.n_players, self.to_bytes()))
+
+    def to_bytes(self):
+        """Return the raw bytes of the record"""
+        return self.data.tobytes()
+
+    @property
+    def n_players(self):
+        return self.data['tokens'].shape[0]
+
+    @property
+    def nbytes(self):
+        return self.data.dtype.itemsize
+
+    @property
+    def token_pool(self):
+        return self.data['token_pool']
+
+    @property
+    def tokens(self):
+        return self.data['tokens']
+
+    @property
+    def bonuses(self):
+        return self.data['bonuses']
+
+    @property
+    def points(self):
+        return self.data['points']
+
+    @property
+    def reservations(self):
+        return self.data['reservations']
+
+    @property
+    def board(self):
+        return self.data['board']
+
+    @property
+    def nobles(self):
+        return self.data['nobles']
+
+    def deck(self, tier):
+        """Remaining card ids of a tier's deck, top card first"""
+        ids = catalog.load().tier_ids[tier]
+        positions = self.data['cards'][ids]
+        in_deck = (positions >= 0) & (positions < OWNED)
+        return ids[in_deck][np.argsort(positions[in_deck])]
+
+    @property
+    def turn(self):
+        return int(self.data['turn'])
+
+    @property
+    def final_round(self):
+        return bool(self.data['final_round'])
+
+    def __eq__(self, other):
+        return isinstance(other, CompactState) and self.to_bytes() == other.to_bytes()
+
+    def __hash__(self):
+        return hash(self.to_bytes())
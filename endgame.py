@@ -0,0 +1,79 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+endgame.py - Exact search of the rest of the round once a player nears victory
+"""
+
+import time
+import settings, mcts, expectimax
+
+WIN = 1.0
+LOSS = 0.0
+# Positions where the game goes on are scored between a loss and a win
+UNDECIDED_LOW = 0.25
+UNDECIDED_HIGH = 0.75
+
+_table = None
+# Seed and player count of the game the table's positions were solved in
+_table_game = None
+
+
+class Solver(expectimax.Search):
+    """Searches every line to the end of the round, where the game is won, lost or goes on
+
+    Opponents play to stop the searching player winning, and dealt cards are
+    averaged over, so a value of WIN is a win whatever is dealt.
+    """
+
+    def evaluate(self):
+        state = self.state
+        if state.final_round:
+            # Highest score wins, ties going to fewest cards as in GameState.end_game
+            return mcts.score(state)[self.player]
+        return UNDECIDED_LOW + (UNDECIDED_HIGH - UNDECIDED_LOW) * mcts.score(state)[self.player]
+
+
+def table(gamestate):
+    """Solved positions of this process, kept for the later endgames of the same game
+
+    Keys don't cover the cards still to be dealt, so positions from another game's
+    decks are thrown away, as are those of snapshots, which have no seed.
+    """
+    global _table, _table_game
+
+    game = (gamestate.seed, len(gamestate.players))
+    if _table is None or game != _table_game or gamestate.seed is None:
+        _table = expectimax.TranspositionTable(settings.ENDGAME_TABLE_SIZE)
+        _table_game = game
+    return _table
+
+
+def turns_left(gamestate):
+    """Turns until the end of the round, when the game can end"""
+    n_players = len(gamestate.players)
+    return n_players - gamestate.turn % n_players
+
+
+def applies(gamestate):
+    """Check if a player is close enough to victory, late enough in the round, to solve"""
+    leader = max(player.score() for player in gamestate.players)
+    return leader >= settings.VICTORY_POINTS_REQUIRED - settings.ENDGAME_MARGIN and \
+        turns_left(gamestate) <= settings.ENDGAME_TURNS
+
+
+def solve(gamestate, transpositions=None, deadline=None, stop=None):
+    """Best action to the end of the round, and whether it matters
+
+    The result is decisive when the action forces a win, or when some other action
+    would lose, e.g. by not reserving a card an opponent needs. Neither can be known
+    until the end of the round is reached, so a solve cut short by the deadline is
+    never decisive.
+    """
+    start = time.perf_counter()
+    solver = Solver(gamestate, transpositions if transpositions is not None else table(gamestate), deadline, stop)
+    action, value = solver.best_action(turns_left(gamestate))
+    decisive = action is not None and (value == WIN or LOSS in solver.root_values.values())
+    stats = {"nodes": solver.nodes, "value": value, "decisive": decisive,
+             "seconds": time.perf_counter() - start}
+    return action, stats
@@ -0,0 +1,249 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+expectimax.py - Depth limited paranoid expectimax search with a transposition table
+"""
+
+import time
+import settings, moves, mcts, zobrist
+import numpy as np
+
+# Bounds recorded with a stored value
+EXACT, LOWER, UPPER = 0, 1, 2
+
+_table = None
+
+
+class OutOfTime(Exception):
+    """Raised inside a search once its deadline has passed"""
+
+
+class TranspositionTable:
+    """Fixed size table of searched positions, indexed by the low bits of their key
+
+    A slot is overwritten by a search to at least the same depth, or by any entry
+    of a later search, so memory stays the same however long the game runs.
+    """
+
+    def __init__(self, size):
+        # Round up to a power of two so the index is a mask of the key
+        size = 1 << max(0, int(size) - 1).bit_length()
+        self.mask = size - 1
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.depths = np.full(size, -1, dtype=np.int8)
+        self.generations = np.zeros(size, dtype=np.int32)
+        self.values = np.zeros(size)
+        self.flags = np.zeros(size, dtype=np.int8)
+        self.actions = np.full(size, -1, dtype=np.int16)
+        self.generation = 0
+
+    def probe(self, key):
+        """Returns the stored depth, value, bound and best action of a key, or None"""
+        i = key & self.mask
+        if self.depths[i] < 0 or int(self.keys[i]) != key:
+            return None
+        return int(self.depths[i]), float(self.values[i]), int(self.flags[i]), int(self.actions[i])
+
+    def store(self, key, depth, value, flag, action):
+        i = key & self.mask
+        if self.depths[i] < 0 or self.generations[i] != self.generation or depth >= self.depths[i]:
+            self.keys[i] = key
+            self.depths[i] = depth
+            self.generations[i] = self.generation
+            self.values[i] = value
+            self.flags[i] = flag
+            self.actions[i] = action
+
+    def new_search(self):
+        """Lets entries of earlier searches be replaced regardless of depth"""
+        self.generation += 1
+
+
+def table():
+    """Transposition table of this process, created on first use"""
+    global _table
+
+    if _table is None:
+        _table = TranspositionTable(settings.TRANSPOSITION_TABLE_SIZE)
+    return _table
+
+
+class Search:
+    """Search from one player's point of view, opponents playing to minimise its reward
+
+    Dealing a hidden card is a chance node averaging over every unseen card of the
+    tier. Depth is counted in turns, and leaves are scored with the tree search
+    reward of the searching player.
+    """
+
+    def __init__(self, gamestate, transpositions=None, deadline=None, stop=None):
+        self.state = gamestate.clone()
+        self.player = gamestate.turn % len(gamestate.players)
+        self.table = transpositions if transpositions is not None else table()
+        # time.perf_counter() value by which the search must return
+        self.deadline = deadline
+        # Event that cancels the search when set
+        self.stop = stop
+        self.nodes = 0
+        self.root_action = None
+        self.root_values = {}
+
+    def best_action(self, depth):
+        """Returns the best action and value of the deepest search finished before the deadline
+
+        Each depth is searched in turn, the table ordering the next depth's moves. If
+        not even one turn can be searched in time the action is None.
+        """
+        self.table.new_search()
+        h = zobrist.position(self.state)
+        action, value, root_values = None, None, {}
+        for d in range(1, depth + 1):
+            self.root_values = {}
+            try:
+                value = self.value(h, d, -np.inf, np.inf)
+            except OutOfTime:
+                break
+            action, root_values = self.root_action, self.root_values
+        self.root_values = root_values
+        return action, value
+
+    def key(self, h):
+        # Values are from the searching player's point of view, so it is part of the key
+        return zobrist.key(self.state, h) ^ zobrist.SEARCHER[self.player]
+
+    def value(self, h, depth, alpha, beta):
+        """Paranoid alpha-beta value of the current position"""
+        state = self.state
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise OutOfTime()
+        if self.stop is not None and self.stop.is_set():
+            raise OutOfTime()
+        actions = [] if depth == 0 else moves.legal_actions(state)
+        if len(actions) == 0:
+            return self.evaluate()
+
+        # Step 1 - Reuse a stored result, or at least its best action
+        root = len(state.move_stack) == 0
+        key = self.key(h)
+        entry = self.table.probe(key)
+        if entry is not None:
+            stored_depth, stored, flag, action = entry
+            if stored_depth >= depth and not root:
+                if flag == EXACT:
+                    return stored
+                if flag == LOWER:
+                    alpha = max(alpha, stored)
+                else:
+                    beta = min(beta, stored)
+                if alpha >= beta:
+                    return stored
+            if action in actions:
+                actions.remove(action)
+                actions.insert(0, action)
+
+        # Step 2 - Search each action, the searching player maximising
+        maximising = state.turn % len(state.players) == self.player
+        window = (alpha, beta)
+        best = -np.inf if maximising else np.inf
+        best_action = actions[0]
+        for action in actions:
+            v = self.action_value(h, action, depth, alpha, beta)
+            if root:
+                self.root_values[action] = v
+            if (maximising and v > best) or (not maximising and v < best):
+                best = v
+                best_action = action
+            if maximising:
+                alpha = max(alpha, v)
+            else:
+                beta = min(beta, v)
+            if alpha >= beta:
+                break
+
+        # Step 3 - Store with the bound the window allows
+        if best <= window[0]:
+            flag = UPPER
+        elif best >= window[1]:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, best, flag, best_action)
+        if root:
+            self.root_action = best_action
+        return best
+
+    def evaluate(self):
+        """Reward of the searching player where the search stops"""
+        return mcts.score(self.state)[self.player]
+
+    def action_value(self, h, action, depth, alpha, beta):
+        """Value of an action, averaged over the hidden cards it could reveal"""
+        # The card dealt only matters if there are moves left to play it
+        hidden = self.hidden_cards(action) if depth > 1 else None
+        if hidden is None:
+            return self.child_value(h, action, depth, alpha, beta)
+
+        # Swap each unseen card into the position the action draws from
+        target, hidden = hidden
+        total = 0.0
+        for cards, i in hidden:
+            swap(target, (cards, i))
+            total += self.child_value(h, action, depth, -np.inf, np.inf)
+            swap(target, (cards, i))
+        return total / len(hidden)
+
+    def child_value(self, h, action, depth, alpha, beta):
+        turn = self.state.turn
+        moves.apply_action(self.state, action)
+        # A noble visit finishes the same turn, so depth counts turns rather than moves
+        v = self.value(zobrist.update(h, self.state), depth - (self.state.turn - turn), alpha, beta)
+        moves.undo_action(self.state)
+        return v
+
+    def hidden_cards(self, action):
+        """Position an action draws a hidden card from, with every unseen card's position
+
+        Reserving slot 0 takes the face down card, and taking a face up card deals
+        the top of the deck. Both are equally likely to be any card of the tier
+        that has not been seen.
+        """
+        move = moves.ACTIONS[action]
+        if move[0] != "buy" and move[0] != "reserve":
+            return None
+        tier, slot = move[1], move[2]
+        flop = self.state.development_cards[1][tier]
+        deck = self.state.development_cards[0][tier]
+        if slot == 0:
+            target = (flop, 0)
+        elif len(deck) > 0:
+            target = (deck, 0)
+        else:
+            return None
+        hidden = [(flop, 0)] + [(deck, i) for i in range(len(deck))]
+        if len(hidden) == 1:
+            return None
+        return target, hidden
+
+
+def swap(a, b):
+    (cards_a, i), (cards_b, j) = a, b
+    cards_a[i], cards_b[j] = cards_b[j], cards_a[i]
+
+
+def search(gamestate, depth=None, transpositions=None, deadline=None, stop=None):
+    """Best action for the player to move, with search statistics
+
+    Out of time before the first turn is searched, the greedy rollout move is played.
+    """
+    if depth is None:
+        depth = settings.EXPECTIMAX_DEPTH
+    start = time.perf_counter()
+    searcher = Search(gamestate, transpositions, deadline, stop)
+    action, value = searcher.best_action(depth)
+    if action is None:
+        action = mcts.greedy_action(gamestate)
+    seconds = time.perf_counter() - start
+    stats = {"nodes": searcher.nodes, "value": value, "seconds": seconds}
+    return action, stats
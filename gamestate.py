@@ -6,62 +6,52 @@ aca18cjb, (c) Chris Berisford 2021
 gamestate.py - Contains all information related to the gamestate
 """
 
-import random, math, csv, settings
+import math, settings, catalog, compact, worker
 import player as p, numpy as np
 
 # Disables calls to UI for testing
 TESTING_MODE = settings.TESTING_MODE
 
 class GameState:
-    def __init__(self, n_humans, n_total, ai_type):
+    def __init__(self, n_humans, n_total, ai_type, seed=None):
         """Sets up gameboard, deals all cards and adds players"""
-        development_cards = []
-        noble_cards = []
         self.players = []
         self.dealt = []
         self.ai_type = ai_type
 
+        # Every random draw in the game comes from its own generator, so it can be replayed
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # Incremented whenever cards or nobles on the board change, to invalidate weights
+        self.board_version = 0
+        # Turn that player weights were last brought up to date for
+        self.weights_turn = None
+
         # add players to game
         for x in range(n_humans):
             self.add_human_player(x)
 
         for x in range(n_total - n_humans):
-            self.add_ai_player(x, self.ai_type)
-
-        # import, shuffle and deal_cards development cards
-        with open('data/development_cards.csv', mode='r')as file:
-            csvFile = csv.reader(file)
-            next(csvFile)
-            for lines in csvFile:
-                level = int(lines[0])
-                gemType = lines[1]
-                pointValue = int(lines[2])
-                purchaseCost = [int(lines[3]), int(lines[4]), int(
-                    lines[5]), int(lines[6]), int(lines[7])]
-                add_card = self.DevelopmentCard(
-                    level, gemType, pointValue, purchaseCost)
-                development_cards.append(add_card)
-
-        random.shuffle(development_cards)
-        dev_1_deck = [card for card in development_cards if card.level == 1]
-        dev_2_deck = [card for card in development_cards if card.level == 2]
-        dev_3_deck = [card for card in development_cards if card.level == 3]
-
-        dev_1_deck, dev_1_flop = self.deal_cards([], dev_1_deck, 5, 0)
-        dev_2_deck, dev_2_flop = self.deal_cards([], dev_2_deck, 5, 0)
-        dev_3_deck, dev_3_flop = self.deal_cards([], dev_3_deck, 5, 0)
-
-        # import, shuffle and deal_cards noble cards
-        with open('data/noble_cards.csv', mode='r')as file:
-            csvFile = csv.reader(file)
-            next(csvFile)
-            for lines in csvFile:
-                prerequisites = [int(lines[0]), int(lines[1]), int(
-                    lines[2]), int(lines[3]), int(lines[4])]
-                add_card = self.NobleCard(prerequisites)
-                noble_cards.append(add_card)
-
-        random.shuffle(noble_cards)
+            self.add_ai_player(n_humans + x, self.ai_type)
+
+        # shuffle card ids and deal development cards from the shared catalog
+        card_catalog = catalog.load()
+        dev_decks = []
+        for tier_ids in card_catalog.tier_ids:
+            ids = tier_ids.tolist()
+            self.rng.shuffle(ids)
+            dev_decks.append([card_catalog.cards[i] for i in ids])
+
+        dev_1_deck, dev_1_flop = self.deal_cards([], dev_decks[0], 5, 0)
+        dev_2_deck, dev_2_flop = self.deal_cards([], dev_decks[1], 5, 0)
+        dev_3_deck, dev_3_flop = self.deal_cards([], dev_decks[2], 5, 0)
+
+        # shuffle noble ids and deal noble cards
+        ids = card_catalog.noble_ids.tolist()
+        self.rng.shuffle(ids)
+        noble_cards = [card_catalog.nobles[i] for i in ids]
         noble_deck, noble_flop = self.deal_cards(
             [], noble_cards, len(self.players) + 1, 0)
 
@@ -87,6 +77,9 @@ class GameState:
         self.development_cards = development_cards
         self.turn = 0
         self.final_round = False
+        self.game_over = False
+        self.noble_pending = False
+        self.move_stack = []
         self.game_summary = self.GameSummary(self)
         self.round_number = int((math.floor(self.turn) / len(self.players)) + 1)
 
@@ -100,17 +93,41 @@ class GameState:
             self.token_pool
         )
 
+    def clone(self):
+        """Returns an independent copy for lookahead, sharing card records and the random generator"""
+        clone = GameState.__new__(GameState)
+        clone.__dict__.update(self.__dict__)
+
+        # Copy only the containers that change during play
+        clone.players = [player.clone() for player in self.players]
+        clone.dealt = self.dealt.copy()
+        clone.token_pool = self.token_pool.copy()
+        clone.temp_pool = self.temp_pool.copy()
+        clone.development_cards = [[tier.copy() for tier in self.development_cards[0]],
+                                   [tier.copy() for tier in self.development_cards[1]]]
+        clone.noble_cards = [self.noble_cards[0].copy(), self.noble_cards[1].copy()]
+        clone.move_stack = []
+
+        # Lookahead keeps its own log so the real game summary is left untouched
+        clone.game_summary = self.GameSummary(clone)
+        clone.game_summary.errors = self.game_summary.errors
+        return clone
+
+    def compact(self):
+        """Returns a compact record of the game, a few hundred bytes to hand to other processes"""
+        return compact.CompactState.from_gamestate(self)
+
     def add_human_player(self, id):
         """Adds human player to the game"""
         # print("Human player added.")
         self.players.append(p.Player("Player " + str(id + 1),
-                                     id, [0, 0, 0, 0, 0, 0], [], [], []))
+                                     id, [0, 0, 0, 0, 0, 0], [], [], [], self.rng))
 
     def add_ai_player(self, id, ai_type):
         """Adds AI player to the game"""
         # print("AI player added.")
-        self.players.append(p.AI("Player " + str(settings.NUMBER_OF_PLAYERS +
-                                                 id) + " (AI)", settings.NUMBER_OF_PLAYERS + id, [0, 0, 0, 0, 0, 0], [], [], [], ai_type))
+        self.players.append(p.AI("Player " + str(id) + " (AI)",
+                                 id, [0, 0, 0, 0, 0, 0], [], [], [], ai_type, self.rng))
 
     def remove_players(self):
         """Removes all current players from game"""
@@ -133,37 +150,27 @@ class GameState:
 
     def disable_ui(self, UI):
         """Disables class interaction with UI"""
-        if not TESTING_MODE:
+        if not TESTING_MODE and UI is not None:
             UI.links_enabled = False
             UI.update_gui()
 
     def acquire_noble(self, player, card, index, UI):
         """Adds noble to player hand"""
-        difference = []
-        is_affordable = False
-
-        zip_object = zip(
-            self.players[player].count_wealth(), card.prerequisites)
-        for x, y in zip_object:
-            difference.append(x - y)
-
-        if min(difference) >= 0:
-            is_affordable = True
-
-        if is_affordable:
+        if catalog.noble_proximity(card, self.players[player].bonuses)[1]:
             card_to_append = self.noble_cards[1][index]
             self.noble_cards[1].pop(index)
-            self.players[player].nobles.append(card_to_append)
-            if not TESTING_MODE:
+            self.board_version += 1
+            self.players[player].add_noble(card_to_append)
+            if not TESTING_MODE and UI is not None:
                 UI.display_message(
                     "> Player " + str(player + 1) + " has acquired a noble.")
                 UI.nobles_enabled = False
                 UI.links_enabled = True
             self.skipNobleCheck = True
-            self.increment_turn(UI)
+            self.end_turn(UI)
 
         else:
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 UI.display_message(
                     "[Error] You do not meet the requirements for this noble")
 
@@ -174,7 +181,7 @@ class GameState:
         player_tokens = np.array(player.tokens)
         holding_tokens = np.array(player.holding_tokens)
         dev_card_contribution = np.array(player.count_wealth())
-        raw_card_cost = np.array(deck[index].purchaseCost + [0])
+        raw_card_cost = deck[index].cost
 
         # Apply gold token discount
         effective_wealth = player_tokens + holding_tokens
@@ -214,7 +221,7 @@ class GameState:
             self.game_summary.turn_data[player_id][round_number] = "B" + str(deck[index].level)
 
             # Add card to player hand
-            player.cards.append(deck[index])
+            player.add_card(deck[index])
 
             # Remove card from its deck
             level = deck[index].level
@@ -222,7 +229,7 @@ class GameState:
 
             # Redeal if necessesary, i.e. not purchased from player reservations
             if calledFrom == "board":
-                if not TESTING_MODE:
+                if not TESTING_MODE and UI is not None:
                     UI.display_message(
                         "> Player " + str(player_id + 1) + " acquired a card.")
                 flop = self.development_cards[1][level-1]
@@ -230,7 +237,7 @@ class GameState:
                 self.development_cards[0][level-1], self.development_cards[1][level -
                                                                               1] = self.deal_cards(flop, drawfrom, 1, index)
             else:
-                if not TESTING_MODE:
+                if not TESTING_MODE and UI is not None:
                     UI.display_message(
                         "> Player " + str(player_id + 1) + " acquired a card form their reservations.")
 
@@ -250,27 +257,27 @@ class GameState:
             player.holding_tokens = [0, 0, 0, 0, 0, 0]
 
             # Inform player
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 UI.display_message("[Error] You cannot afford this card.")
                 UI.redraw_player(player_id)
 
+    def is_aggressive_reservation(self, card):
+        """Check if a face up card is valuable enough to any player to be reserved aggressively"""
+
+        # Compare against the weights every player had at the start of the turn
+        self.refresh_weights()
+        for other in self.players:
+            v = list(other.w_card.values())
+            value_threshold = max([np.mean(v) + (1.5 * np.std(v)), 0])
+            if other.w_card[card] >= value_threshold:
+                return True
+        return False
+
     def reserve_card(self, player, deck, index, UI):
         """Moves card to player reservation pool"""
 
-        # Calculate value threshold to be categorised as aggressive
-        cardToReserve = deck[index] 
-
-        # Need to determine weights first
-        aggressive_reservation = False
-        if index != 0:
-            for p in self.players:
-                p.get_probabilities(self.dealt)
-                p.get_weights(self)
-                p.get_desired_types()
-                v = list(p.w_card.values())
-                value_threshold = max([np.mean(v) + (1.5 * np.std(v)), 0])
-                if p.w_card[cardToReserve] >= value_threshold:
-                    aggressive_reservation = True
+        # Face down cards can't be reserved aggressively
+        aggressive_reservation = index != 0 and self.is_aggressive_reservation(deck[index])
 
         self.players[player].reservations.append(deck[index])
         level = deck[index].level
@@ -322,11 +329,12 @@ class GameState:
             message = "> Player " + str((self.turn % len(self.players)) + 1) + \
                 " reserved a card but did not acquire a gold token as there are none left."
 
-        if not TESTING_MODE:
+        if not TESTING_MODE and UI is not None:
             UI.display_message(message)
 
     def deal_cards(self, flop, deck, n, beginAt):
         """Deals n cards from deck. Returns deck, flop"""
+        self.board_version += 1
         for card in deck[:n]:
             if isinstance(card, self.DevelopmentCard):
                 self.dealt.insert(0, card)
@@ -339,8 +347,7 @@ class GameState:
                 self.final_round = True
 
     def start_game(self, UI):
-        if isinstance(self.players[0], p.AI):
-            p.AI.evaluation(self.players[0], self, UI)
+        self.play_turns(UI)
 
     def end_game(self, UI):
         """Calculates game winner and prints out message"""
@@ -369,48 +376,36 @@ class GameState:
         self.game_summary.winning_player = winner + 1
         self.game_summary.rounds = math.floor(self.turn / len(self.players))
 
-        if not TESTING_MODE:
+        if not TESTING_MODE and UI is not None:
             UI.display_message(
                 "Game Over! Congratulations player " + str(winner + 1))
             UI.display_message(
                 "Please look in program directory for 'session_data.txt' and email it to cjberisford@live.co.uk. Thank you!")
 
         self.game_summary.game_completed = True
-        UI.root.update()
-        UI.root.destroy()
+        self.game_over = True
+        if UI is not None:
+            UI.root.update()
+            UI.root.destroy()
 
     def noble_requirements_met(self, player, player_id, UI):
         """determine if player has met requirements for a noble"""
 
-        potential_matches = []
-
-        player_wealth = player.count_wealth()
-        for noble in self.noble_cards[1]:
-            difference = []
-            zip_object = zip(player_wealth, noble.prerequisites)
-            for x, y in zip_object:
-                if y > 0:
-                    difference.append(x - y)
-            if min(difference) >= 0:
-                potential_matches.append(noble)
+        potential_matches = [noble for noble in self.noble_cards[1]
+                             if catalog.noble_proximity(noble, player.bonuses)[1]]
 
         if len(potential_matches) > 0:
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 UI.display_message("> Player " + str(player_id + 1) +
                                    " has been visited by one or more nobles. Please select a noble tile.")
                 UI.nobles_enabled = True
             self.disable_ui(UI)
         else:
-            self.increment_turn(UI)
+            self.end_turn(UI)
 
     def increment_turn(self, UI):
         """Increases turn count by one as well as performing end of turn checks"""
 
-        player_id = self.turn % len(self.players)
-        player = self.players[player_id]
-        next_player_id = (self.turn + 1) % len(self.players)
-        next_player = self.players[next_player_id]
-
         # Increase turn counter
         self.turn += 1
 
@@ -424,40 +419,202 @@ class GameState:
             
         # Is the AI stuck?
         elif self.game_summary.errors >= 50:
-            UI.root.update()
-            UI.root.destroy()
+            self.game_over = True
+            if UI is not None:
+                UI.root.update()
+                UI.root.destroy()
         else:
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 UI.update_gui()
-                # Check for AI turn
-                if isinstance(next_player, p.AI):
-                    p.AI.evaluation(self.players[next_player_id], self, UI)
 
-    class DevelopmentCard:
-        def __init__(self, level, gemType, pointValue, purchaseCost):
-            self.level = level
-            self.gemType = gemType
-            self.pointValue = pointValue
-            self.purchaseCost = purchaseCost
+    def end_turn(self, UI):
+        """Ends a human turn and hands control to the scheduler"""
+        self.increment_turn(UI)
+        self.play_turns(UI)
+
+    def play_turns(self, UI):
+        """Plays AI turns until a human is to move, searching on a worker thread when there is a UI"""
+        if TESTING_MODE:
+            return
+
+        # Each AI turn returns here rather than calling the next one, so the stack stays flat
+        while not self.game_over:
+            player = self.players[self.turn % len(self.players)]
+            if not isinstance(player, p.AI):
+                # Weights at the start of the human's turn, for pondering and the session log.
+                # AI turns bring them up to date themselves, unless the opening book answers
+                self.refresh_weights()
+                if UI is not None and settings.PONDER:
+                    worker.Ponder(self, UI).start()
+                break
+            ponder = None
+            if UI is not None:
+                ponder, UI.ponder = UI.ponder, None
+            if UI is not None and player.searches(self):
+                if ponder is not None and self.play_pondered(player, ponder, UI):
+                    # Kept until the next search, which waits for it to wind down
+                    UI.ponder = ponder.winding_down()
+                    continue
+                # The search waits for pondering to wind down, so only one runs at a time
+                worker.AITurn(self, player, UI,
+                              lambda move, player=player: self.finish_ai_turn(player, move, UI), ponder).start()
+                return
+            if ponder is not None:
+                ponder.cancel()
+                UI.ponder = ponder.winding_down()
+            # Decision tree turns stay on the Tk thread. They take well under a millisecond,
+            # and update widgets as they go, which only the Tk thread may do
+            player.evaluation(self, UI)
+
+    def play_pondered(self, player, ponder, UI):
+        """Plays the reply pondered during the human's turn, if the human's move was foreseen"""
+        reply = ponder.reply(self)
+        if reply is None:
+            return False
+
+        move, player.search_stats = reply
+        player.play(self, UI, move)
+        return True
+
+    def finish_ai_turn(self, player, move, UI):
+        """Plays a move searched for off the Tk thread, then carries on with the next turn"""
+        player.play(self, UI, move)
+        self.play_turns(UI)
+
+    def refresh_weights(self):
+        """Brings every player's weights up to date once per turn, for the AI and session log"""
+        if self.weights_turn != self.turn:
+            # Card weights of every player whose weights are stale come from one batch
+            stale = [player for player in self.players if player.update_noble_weights(self)]
+            if len(stale) > 0:
+                p.weigh_cards(self, stale)
+                for player in stale:
+                    player.get_desired_types()
+            self.weights_turn = self.turn
+
+    def apply_move(self, move):
+        """Applies a move tuple in place for search, pushing a diff so it can be undone exactly"""
+        player_id = self.turn % len(self.players)
+        player = self.players[player_id]
+        kind = move[0]
+        tokens = None
+        card = None
+        refilled = False
+        previous = (self.final_round, self.noble_pending)
+
+        if kind == "take":
+            tokens = move[1]
+        elif kind == "buy":
+            card = self.development_cards[1][move[1]][move[2]]
+            tokens = self.payment(player, card)
+            refilled = self.take_from_flop(move[1], move[2])
+            player.add_card(card)
+        elif kind == "buy_reserved":
+            card = player.reservations.pop(move[1])
+            tokens = self.payment(player, card)
+            player.add_card(card)
+        elif kind == "reserve":
+            card = self.development_cards[1][move[1]][move[2]]
+            refilled = self.take_from_flop(move[1], move[2])
+            player.reservations.append(card)
+            if self.token_pool[5] > 0 and sum(player.tokens) < 10:
+                tokens = (0, 0, 0, 0, 0, 1)
+        elif kind == "noble":
+            card = self.noble_cards[1].pop(move[1])
+            self.board_version += 1
+            player.add_noble(card)
+
+        # Tokens gained by the player leave the pool and vice versa
+        if tokens is not None:
+            for i in range(6):
+                player.tokens[i] += tokens[i]
+                self.token_pool[i] -= tokens[i]
+
+        # A noble visit is chosen by the same player before the turn passes
+        self.noble_pending = kind not in ("noble", "pass") and len(self.available_nobles(player)) > 0
+        advanced = not self.noble_pending
+        if advanced:
+            self.turn += 1
+            if self.turn % len(self.players) == 0:
+                self.check_for_winner()
 
-        def __str__(self):
-            return "Development Card (Level: {}, Gem Type: {}, Point Value: {}, Cost: {})".format(
-                self.level,
-                self.gemType,
-                self.pointValue,
-                self.purchaseCost
-            )
+        self.move_stack.append((move, player_id, tokens, card, refilled, previous, advanced))
 
-    class NobleCard:
-        def __init__(self, prerequisites):
-            self.prerequisites = prerequisites
+    def undo_move(self):
+        """Reverts the most recently applied move"""
+        move, player_id, tokens, card, refilled, previous, advanced = self.move_stack.pop()
+        player = self.players[player_id]
+        kind = move[0]
+
+        if advanced:
+            self.turn -= 1
+        self.final_round, self.noble_pending = previous
+
+        if tokens is not None:
+            for i in range(6):
+                player.tokens[i] -= tokens[i]
+                self.token_pool[i] += tokens[i]
+
+        if kind == "buy":
+            player.remove_card(card)
+            self.return_to_flop(move[1], move[2], card, refilled)
+        elif kind == "buy_reserved":
+            player.remove_card(card)
+            player.reservations.insert(move[1], card)
+        elif kind == "reserve":
+            player.reservations.pop()
+            self.return_to_flop(move[1], move[2], card, refilled)
+        elif kind == "noble":
+            player.remove_noble(card)
+            self.noble_cards[1].insert(move[1], card)
+            self.board_version += 1
+
+    def payment(self, player, card):
+        """Returns change to player tokens when buying a card, gold covering any shortfall"""
+        tokens = [0, 0, 0, 0, 0, 0]
+        for i in range(5):
+            due = card.purchaseCost[i] - player.bonuses[i]
+            if due > 0:
+                paid = min(due, player.tokens[i])
+                tokens[i] = -paid
+                tokens[5] -= due - paid
+        return tuple(tokens)
+
+    def available_nobles(self, player):
+        """Returns indices of nobles whose prerequisites the player meets"""
+        return [i for i, noble in enumerate(self.noble_cards[1])
+                if catalog.noble_proximity(noble, player.bonuses)[1]]
+
+    def take_from_flop(self, tier, slot):
+        """Removes a card from the board, redealing into its slot. Returns True if redealt"""
+        flop = self.development_cards[1][tier]
+        deck = self.development_cards[0][tier]
+        self.board_version += 1
+        if len(deck) > 0:
+            flop[slot] = deck.pop(0)
+            self.dealt.insert(0, flop[slot])
+            return True
+        del flop[slot]
+        return False
+
+    def return_to_flop(self, tier, slot, card, refilled):
+        """Puts a card back on the board, returning any redealt card to its deck"""
+        flop = self.development_cards[1][tier]
+        self.board_version += 1
+        if refilled:
+            self.dealt.pop(0)
+            self.development_cards[0][tier].insert(0, flop[slot])
+            flop[slot] = card
+        else:
+            flop.insert(slot, card)
 
-        def __str__(self):
-            return "Noble Card (Prerequisites: {})".format(self.prerequisites)
+    DevelopmentCard = catalog.DevelopmentCard
+    NobleCard = catalog.NobleCard
 
     class GameSummary:
         def __init__(self, gamestate):
             self.ai_type = gamestate.ai_type
+            self.seed = gamestate.seed
             self.rounds = 0
             self.risk_counter = 0
             self.winning_player = 0
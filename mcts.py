@@ -0,0 +1,398 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+mcts.py - Monte Carlo tree search over legal moves, with heuristic rollouts
+"""
+
+import math, time, os, sys, multiprocessing
+import moves, catalog
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+
+# UCT exploration constant
+EXPLORATION = 1.4
+# Plies played out from a new node before the position is scored
+ROLLOUT_DEPTH = 8
+# Chance that a rollout buys the highest scoring card it can, rather than moving at random
+GREEDY_BUY = 0.8
+# Seconds kept back from a parallel search for collecting the workers' results
+RESULT_MARGIN = 0.05
+# Seconds between checks for a stop while waiting on the workers
+STOP_POLL = 0.02
+
+BUY_ACTIONS = frozenset([action for tier in moves.BUY for action in tier[1:]] + moves.BUY_RESERVED)
+TAKE_ACTIONS = frozenset([action for action, _ in moves.TAKE_DIFFERENT[3]] +
+                         [action for action, _ in moves.TAKE_DOUBLE])
+
+# Worker processes of root parallel search, kept between moves, and a count of the searches
+# handed to them, moved on to stop the current one
+_pool = None
+_pool_workers = 0
+_pool_search = None
+# The pool's search count, as seen from inside a worker process
+_worker_search = None
+
+
+class Node:
+    """A position in the search tree, reached by one action"""
+    __slots__ = ('action', 'parent', 'player', 'children', 'untried', 'visits', 'value', 'available')
+
+    def __init__(self, action, parent, player, actions):
+        self.action = action
+        self.parent = parent
+        # Player who made the action, whose reward is accumulated here
+        self.player = player
+        self.children = []
+        self.untried = actions
+        self.visits = 0
+        self.value = 0.0
+        # Iterations in which the action was legal, for information set search
+        self.available = 0
+
+    def select(self):
+        """Child with the highest upper confidence bound"""
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.value / child.visits +
+                   EXPLORATION * math.sqrt(log_visits / child.visits))
+
+
+class Determinizer:
+    """Samples the hidden cards of each tier in batches, consistent with the cards dealt
+
+    Every card that has left a deck is in GameState.dealt. Those still in slot 0 of
+    a flop are face down, so the unseen cards of a tier are its cards that have not
+    been dealt, plus its face down card.
+    """
+
+    def __init__(self, gamestate, batch_size, rng):
+        card_catalog = catalog.load()
+        face_down = set(id(tier[0]) for tier in gamestate.development_cards[1] if len(tier) > 0)
+        seen = set(card.id for card in gamestate.dealt if id(card) not in face_down)
+
+        self.cards = card_catalog.cards
+        self.unseen = [np.array([i for i in ids.tolist() if i not in seen], dtype=int)
+                       for ids in card_catalog.tier_ids]
+        self.batch_size = batch_size
+        self.rng = rng
+        self.index = batch_size
+
+    def sample(self):
+        """Draw a batch of orderings of the unseen cards of every tier"""
+        self.batch = [self.rng.permuted(np.tile(unseen, (self.batch_size, 1)), axis=1).tolist()
+                      for unseen in self.unseen]
+        self.index = 0
+
+    def apply(self, state):
+        """Deal the next sampled ordering into the face down slots and decks of a root state"""
+        if self.index == self.batch_size:
+            self.sample()
+        for tier in range(3):
+            ids = self.batch[tier][self.index]
+            if len(ids) > 0:
+                self.face_down(state, tier, [self.cards[i] for i in ids])
+        self.index += 1
+
+    def face_down(self, state, tier, cards):
+        """Place the first card face down and the rest as the deck"""
+        state.development_cards[1][tier][0] = cards[0]
+        state.development_cards[0][tier] = cards[1:]
+
+
+def search(gamestate, iterations=None, time_limit=None, rng=None, determinizations=None, stop=None):
+    """Search from the current position and return the best action with search statistics
+
+    The search stops after the given number of iterations or seconds, whichever
+    comes first. Moves are played on a clone and undone after every iteration.
+    Given a number of determinizations, the hidden cards are resampled in batches
+    of that size and every iteration searches a different sample, so that the
+    search does not see the decks or face down cards. Setting the stop event, a
+    threading.Event, ends the search early.
+    """
+    root, n, seconds = grow(gamestate, iterations, time_limit, rng, determinizations, stop)
+    if len(root.children) > 0:
+        action = max(root.children, key=lambda child: child.visits).action
+    else:
+        action = root.untried[0]
+    stats = {"iterations": n, "seconds": seconds, "rate": n / seconds if seconds > 0 else 0}
+    return action, stats
+
+
+def grow(gamestate, iterations=None, time_limit=None, rng=None, determinizations=None, stop=None):
+    """Build a search tree, returning its root with the iterations run and seconds taken"""
+    state = gamestate.clone()
+    if rng is None:
+        # One draw from the game's generator, however long the search runs, so a
+        # seeded game replays the same whatever the search budget
+        rng = np.random.default_rng(gamestate.rng.integers(0, 2 ** 63))
+    root = Node(None, None, None, moves.legal_actions(state))
+    determinizer = None
+    if determinizations is not None:
+        determinizer = Determinizer(state, determinizations, rng)
+
+    start = time.perf_counter()
+    n = 0
+    # A single legal action needs no search
+    if len(root.untried) > 1:
+        while iterations is None or n < iterations:
+            if time_limit is not None and n > 0 and time.perf_counter() - start >= time_limit:
+                break
+            if stop is not None and n > 0 and stop.is_set():
+                break
+            if determinizer is None:
+                iterate(state, root, rng)
+            else:
+                determinizer.apply(state)
+                iterate_information_set(state, root, rng)
+            n += 1
+    return root, n, time.perf_counter() - start
+
+
+def parallel_search(gamestate, iterations=None, time_limit=None, workers=None, determinizations=None,
+                    stop=None):
+    """Root parallel search, merging the root visit counts of one tree per process
+
+    Every worker searches its own tree from a compact snapshot of the game, with its
+    own random seed, while this process grows another. The move takes the given
+    time whatever the number of workers, and results that arrive too late are
+    left out.
+    """
+    if len(moves.legal_actions(gamestate)) <= 1:
+        return search(gamestate, iterations, time_limit, determinizations=determinizations, stop=stop)
+    if workers is None:
+        workers = os.cpu_count()
+    if getattr(sys, "frozen", False):
+        # A frozen executable would relaunch itself in every worker, so search in this process
+        workers = 1
+    deadline = None
+    if time_limit is not None:
+        deadline = time.time() + time_limit
+    seeds = gamestate.rng.integers(0, 2 ** 63, workers)
+
+    # Step 1 - Hand snapshots to the other processes, a few hundred bytes each
+    futures = []
+    if workers > 1:
+        executor = pool(workers - 1)
+        _pool_search.value += 1
+        snapshot = gamestate.compact()
+        futures = [executor.submit(search_worker, snapshot, iterations, deadline, seed, determinizations,
+                                   _pool_search.value) for seed in seeds[1:]]
+
+    # Step 2 - Search here too, leaving time to gather results
+    start = time.perf_counter()
+    local_limit = None
+    if deadline is not None:
+        local_limit = max(0, deadline - RESULT_MARGIN - time.time())
+    root, n, _ = grow(gamestate, iterations, local_limit, np.random.default_rng(seeds[0]), determinizations,
+                      stop)
+    visits = root_visits(root)
+
+    # Step 3 - Merge the visit counts of every tree that finished in time, waiting in
+    # short slices so a stop is seen promptly
+    done = set()
+    pending = set(futures)
+    while len(pending) > 0 and not (stop is not None and stop.is_set()):
+        timeout = STOP_POLL
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.time())
+            if timeout <= 0:
+                break
+        finished, pending = wait(pending, timeout=timeout)
+        done |= finished
+    if len(pending) > 0:
+        # Stopped or out of time - stop the other trees and leave their results
+        _pool_search.value += 1
+        for future in pending:
+            future.cancel()
+    for future in done:
+        worker_visits, worker_n = future.result()
+        n += worker_n
+        for action, count in worker_visits.items():
+            visits[action] = visits.get(action, 0) + count
+
+    seconds = time.perf_counter() - start
+    if len(visits) > 0:
+        action = max(visits, key=visits.get)
+    else:
+        action = root.untried[0]
+    stats = {"iterations": n, "seconds": seconds, "rate": n / seconds if seconds > 0 else 0,
+             "trees": 1 + len(done)}
+    return action, stats
+
+
+def search_worker(snapshot, iterations, deadline, seed, determinizations, search):
+    """Grow one tree in a worker process from a compact snapshot, returning its root visit counts"""
+    rng = np.random.default_rng(seed)
+    gamestate = snapshot.to_gamestate(rng)
+    time_limit = None
+    if deadline is not None:
+        time_limit = max(0, deadline - RESULT_MARGIN - time.time())
+    root, n, _ = grow(gamestate, iterations, time_limit, rng, determinizations, WorkerStop(search))
+    return root_visits(root), n
+
+
+class WorkerStop:
+    """Stop event of a worker's search, set once the parent process moves on from it"""
+    __slots__ = ('search',)
+
+    def __init__(self, search):
+        self.search = search
+
+    def is_set(self):
+        return _worker_search.value != self.search
+
+
+def start_worker(search):
+    """Pool initializer, sharing the pool's search count with the worker process"""
+    global _worker_search
+    _worker_search = search
+
+
+def root_visits(root):
+    return {child.action: child.visits for child in root.children}
+
+
+def pool(workers):
+    """Process pool of the given size, started on first use and kept for later moves"""
+    global _pool, _pool_workers, _pool_search
+
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool_search.value += 1
+            _pool.shutdown(wait=False, cancel_futures=True)
+        # Only this process writes the count, so it needs no lock
+        _pool_search = multiprocessing.RawValue('q', 0)
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=start_worker, initargs=(_pool_search,))
+        _pool_workers = workers
+    return _pool
+
+
+def iterate(state, root, rng):
+    """One select, expand, rollout and backpropagate pass, leaving the state as it was"""
+    node = root
+
+    # Step 1 - Selection
+    while len(node.untried) == 0 and len(node.children) > 0:
+        node = node.select()
+        moves.apply_action(state, node.action)
+
+    # Step 2 - Expansion
+    if len(node.untried) > 0:
+        action = node.untried.pop(int(rng.integers(len(node.untried))))
+        player = state.turn % len(state.players)
+        moves.apply_action(state, action)
+        child = Node(action, node, player, moves.legal_actions(state))
+        node.children.append(child)
+        node = child
+
+    # Step 3 - Rollout
+    reward = rollout(state, rng)
+
+    # Step 4 - Backpropagation
+    while node is not None:
+        node.visits += 1
+        if node.player is not None:
+            node.value += reward[node.player]
+        node = node.parent
+
+    while len(state.move_stack) > 0:
+        state.undo_move()
+
+
+def iterate_information_set(state, root, rng):
+    """One iteration over a determinized state, only following actions legal in it"""
+    node = root
+
+    # Step 1 - Selection, among children whose actions are legal in this determinization
+    actions = root.untried if node is root else None
+    while True:
+        if actions is None:
+            actions = moves.legal_actions(state)
+        if len(actions) == 0:
+            break
+        tried = {child.action: child for child in node.children}
+        untried = [action for action in actions if action not in tried]
+
+        # Step 2 - Expansion
+        if len(untried) > 0:
+            action = untried[int(rng.integers(len(untried)))]
+            player = state.turn % len(state.players)
+            moves.apply_action(state, action)
+            child = Node(action, node, player, None)
+            child.available = 1
+            node.children.append(child)
+            node = child
+            break
+
+        available = [tried[action] for action in actions]
+        for child in available:
+            child.available += 1
+        node = max(available, key=lambda child: child.value / child.visits +
+                   EXPLORATION * math.sqrt(math.log(child.available) / child.visits))
+        moves.apply_action(state, node.action)
+        actions = None
+
+    # Step 3 - Rollout
+    reward = rollout(state, rng)
+
+    # Step 4 - Backpropagation
+    while node is not None:
+        node.visits += 1
+        if node.player is not None:
+            node.value += reward[node.player]
+        node = node.parent
+
+    while len(state.move_stack) > 0:
+        state.undo_move()
+
+
+def rollout(state, rng, depth=ROLLOUT_DEPTH):
+    """Play a few heuristic moves and score the result for every player"""
+    for greedy, pick in rng.random((depth, 2)):
+        actions = moves.legal_actions(state)
+        if len(actions) == 0:
+            break
+        moves.apply_action(state, rollout_action(state, actions, greedy, pick))
+    return score(state)
+
+
+def rollout_action(state, actions, greedy, pick):
+    """Buy the highest scoring card when possible, otherwise mostly pick up tokens"""
+    buys = [action for action in actions if action in BUY_ACTIONS]
+    if len(buys) > 0 and greedy < GREEDY_BUY:
+        return max(buys, key=lambda action: card_for(state, action).pointValue)
+
+    takes = [action for action in actions if action in TAKE_ACTIONS]
+    if len(takes) > 0 and greedy < (1 + GREEDY_BUY) / 2:
+        return takes[int(pick * len(takes))]
+    return actions[int(pick * len(actions))]
+
+
+def greedy_action(state):
+    """Move made without searching, buying the highest scoring card or else taking tokens"""
+    return rollout_action(state, moves.legal_actions(state), 0.0, 0.0)
+
+
+def card_for(state, action):
+    """Card bought by a buy action"""
+    move = moves.ACTIONS[action]
+    if move[0] == "buy":
+        return state.development_cards[1][move[1]][move[2]]
+    return state.players[state.turn % len(state.players)].reservations[move[1]]
+
+
+def score(state):
+    """Rewards between 0 and 1 for each player, 1 to the winner of a finished game"""
+    players = state.players
+    if state.final_round:
+        # Highest score wins, ties go to the player with fewest cards
+        winner = max(range(len(players)), key=lambda i: (players[i].points, -len(players[i].cards)))
+        return [1.0 if i == winner else 0.0 for i in range(len(players))]
+
+    # Otherwise share out reward by points, bonuses and tokens held
+    value = [player.points + 0.25 * sum(player.bonuses) + 0.05 * sum(player.tokens)
+             for player in players]
+    total = sum(value)
+    if total == 0:
+        return [1.0 / len(players)] * len(players)
+    return [v / total for v in value]
@@ -0,0 +1,111 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+moves.py - Enumerates legal moves as small integer actions
+"""
+
+from itertools import combinations
+import numpy as np
+
+# Encoded actions index into this table of gamestate moves
+ACTIONS = []
+
+
+def _register(move):
+    ACTIONS.append(move)
+    return len(ACTIONS) - 1
+
+
+def _stack(gems, count=1):
+    stack = [0, 0, 0, 0, 0, 0]
+    for gem in gems:
+        stack[gem] += count
+    return tuple(stack)
+
+
+# Token picks of n different gems, keyed by n
+TAKE_DIFFERENT = {n: [(_register(("take", _stack(gems))), gems)
+                      for gems in combinations(range(5), n)] for n in (3, 2, 1)}
+TAKE_DOUBLE = [(_register(("take", _stack([gem], 2))), gem) for gem in range(5)]
+
+# Slot 0 of each tier is the face down card, slots 1-4 are face up
+RESERVE = [[_register(("reserve", tier, slot)) for slot in range(5)] for tier in range(3)]
+BUY = [[None] + [_register(("buy", tier, slot)) for slot in range(1, 5)] for tier in range(3)]
+BUY_RESERVED = [_register(("buy_reserved", index)) for index in range(3)]
+NOBLE = [_register(("noble", index)) for index in range(5)]
+PASS = _register(("pass",))
+
+ACTIONS = tuple(ACTIONS)
+
+# Every token pick as a row of one table, largest picks first so ties favour taking more
+TOKEN_PICK_ACTIONS = [action for n in (3, 2, 1) for action, _ in TAKE_DIFFERENT[n]] + \
+    [action for action, _ in TAKE_DOUBLE]
+TOKEN_PICKS = np.array([ACTIONS[action][1] for action in TOKEN_PICK_ACTIONS])
+TOKEN_PICK_SIZES = TOKEN_PICKS.sum(axis=1)
+TOKEN_PICK_DOUBLES = TOKEN_PICKS.max(axis=1) == 2
+SINGLE_PICK_ROWS = [TOKEN_PICK_ACTIONS.index(action) for action, _ in TAKE_DIFFERENT[1]]
+DOUBLE_PICK_ROWS = [TOKEN_PICK_ACTIONS.index(action) for action, _ in TAKE_DOUBLE]
+
+
+def affordable(gamestate, player, card):
+    """Check if a player's tokens, bonuses and gold cover a card"""
+    return -gamestate.payment(player, card)[5] <= player.tokens[5]
+
+
+def legal_actions(gamestate):
+    """Returns every legal action for the player to move"""
+    if gamestate.final_round:
+        return []
+
+    player = gamestate.players[gamestate.turn % len(gamestate.players)]
+
+    # Noble visits are resolved before the turn passes
+    if gamestate.noble_pending:
+        return [NOBLE[i] for i in gamestate.available_nobles(player)]
+
+    actions = []
+    pool = gamestate.token_pool
+    capacity = 10 - sum(player.tokens)
+
+    # Take tokens - three different gems, or as many as the pool and token limit allow
+    available = [gem for gem in range(5) if pool[gem] > 0]
+    n_take = min(3, capacity, len(available))
+    if n_take > 0:
+        for action, gems in TAKE_DIFFERENT[n_take]:
+            if all(pool[gem] > 0 for gem in gems):
+                actions.append(action)
+    if capacity >= 2:
+        for action, gem in TAKE_DOUBLE:
+            if pool[gem] >= 4:
+                actions.append(action)
+
+    # Buy from the board or from reservations
+    for tier in range(3):
+        flop = gamestate.development_cards[1][tier]
+        for slot in range(1, len(flop)):
+            if affordable(gamestate, player, flop[slot]):
+                actions.append(BUY[tier][slot])
+    for index, card in enumerate(player.reservations):
+        if affordable(gamestate, player, card):
+            actions.append(BUY_RESERVED[index])
+
+    # Reserve face up or face down
+    if len(player.reservations) < 3:
+        for tier in range(3):
+            for slot in range(len(gamestate.development_cards[1][tier])):
+                actions.append(RESERVE[tier][slot])
+
+    if len(actions) == 0:
+        actions.append(PASS)
+    return actions
+
+
+def apply_action(gamestate, action):
+    """Applies an encoded action to the gamestate"""
+    gamestate.apply_move(ACTIONS[action])
+
+
+def undo_action(gamestate):
+    """Reverts the last applied action"""
+    gamestate.undo_move()
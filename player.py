@@ -6,15 +6,49 @@ aca18cjb, (c) Chris Berisford 2021
 player.py - Contains all information relating to a player
 """
 
-import settings, random, math
+import settings, math, time, moves, catalog, mcts, expectimax, endgame, book
 import numpy as np
+from operator import itemgetter
 
 # Disables calls to UI for testing
 TESTING_MODE = settings.TESTING_MODE
 
 
+def weigh_cards(gamestate, players):
+    """Calculate card and token weights of several players with one matrix product"""
+
+    # Every player weighs the board and all reservations, keeping the weights of their own cards
+    faceup_cards = players[0].get_faceup_cards(gamestate)
+    facedown_cards = players[0].get_facedown_cards(gamestate)
+    n_faceup = len(faceup_cards)
+    n_board = n_faceup + len(facedown_cards)
+    rows = catalog.card_rows(faceup_cards + facedown_cards +
+                             [card for player in players for card in player.reservations])
+
+    columns, r_squared = zip(*[player.weight_columns() for player in players])
+    m = np.array([column for player_columns in columns for column in player_columns]).T
+    terms = (rows @ m).reshape(len(rows), len(players), 3)
+    w = terms[:, :, 1] + np.sqrt(terms[:, :, 0] + r_squared) * terms[:, :, 2]
+
+    # Token weights count face up cards and the player's own reservations
+    counted = np.zeros_like(w)
+    counted[:n_faceup] = w[:n_faceup]
+    reserved = []
+    start = n_board
+    for i, player in enumerate(players):
+        reserved.append(slice(start, start + len(player.reservations)))
+        counted[reserved[i], i] = w[reserved[i], i]
+        start += len(player.reservations)
+    counts = (counted.T @ rows[:, catalog.ROW_COST_PER_LEVEL]).tolist()
+
+    for i, (player, weights) in enumerate(zip(players, w.T.tolist())):
+        player.w_card, player.w_card_fd, player.w_card_r = player.split_w_card(
+            weights[:n_board] + weights[reserved[i]], [faceup_cards, facedown_cards, player.reservations])
+        player.w_token = dict(zip(settings.RESOURCE_TYPES[:5], counts[i]))
+
+
 class Player:
-    def __init__(self, name, id, tokens, cards, reservations, nobles):
+    def __init__(self, name, id, tokens, cards, reservations, nobles, rng=None):
         self.id = id
         self.name = name
         self.tokens = tokens
@@ -31,6 +65,22 @@ class Player:
         self.ai_type = 1
         self.desired_types = []
 
+        # Random generator of the game, for stochastic behaviour
+        if rng is None:
+            rng = np.random.default_rng()
+        self.rng = rng
+
+        # Board version and hand that the cached weights were calculated against
+        self.weights_board = None
+        self.weights_hand = None
+
+        # Bonuses and score are maintained as cards and nobles are added
+        self.bonuses = [0, 0, 0, 0, 0, 0]
+        self.points = len(nobles) * 3
+        for card in cards:
+            self.bonuses[settings.RESOURCE_COLOURS.index(card.gemType)] += 1
+            self.points += card.pointValue
+
     def __str__(self):
         return "PLAYER #{} || Tokens: {}, Development Cards: {}, Reservations: {}, Nobles: {} Current Score: {}".format(
             self.id,
@@ -41,43 +91,54 @@ class Player:
             self.score()
         )
 
+    def clone(self):
+        """Returns a copy of the player with its own hand and token lists"""
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.tokens = self.tokens.copy()
+        clone.cards = self.cards.copy()
+        clone.reservations = self.reservations.copy()
+        clone.nobles = self.nobles.copy()
+        clone.holding_tokens = self.holding_tokens.copy()
+        clone.bonuses = self.bonuses.copy()
+        clone.desired_types = list(self.desired_types)
+        return clone
+
     def score(self):
         """Returns player's current score"""
-        nobles_score = len(self.nobles) * 3
-        card_score = 0
-        for card in self.cards:
-            card_score += card.pointValue
-        return nobles_score + card_score
+        return self.points
 
     def count_wealth(self):
         """Calculates resource value of development cards"""
-        count = [0, 0, 0, 0, 0, 0]
-
-        for card in self.cards:
-            if card.gemType == settings.RESOURCE_COLOURS[0]:
-                count[0] += 1
-            if card.gemType == settings.RESOURCE_COLOURS[1]:
-                count[1] += 1
-            if card.gemType == settings.RESOURCE_COLOURS[2]:
-                count[2] += 1
-            if card.gemType == settings.RESOURCE_COLOURS[3]:
-                count[3] += 1
-            if card.gemType == settings.RESOURCE_COLOURS[4]:
-                count[4] += 1
-        return count
-
-    def get_euclidian_distance(self, vector_x, vector_y):
-        """Calculate how far player is from obtaining noble"""
-        x = np.array(vector_x)
-        y = np.array(vector_y)
-        error = np.linalg.norm(x-y)
-        return error
+        return list(self.bonuses)
+
+    def add_card(self, card):
+        """Adds development card to hand, keeping bonuses and score up to date"""
+        self.cards.append(card)
+        self.bonuses[card.gem] += 1
+        self.points += card.pointValue
+
+    def add_noble(self, noble):
+        """Adds noble to hand, keeping score up to date"""
+        self.nobles.append(noble)
+        self.points += 3
+
+    def remove_card(self, card):
+        """Removes development card from hand, reversing add_card"""
+        self.cards.remove(card)
+        self.bonuses[card.gem] -= 1
+        self.points -= card.pointValue
+
+    def remove_noble(self, noble):
+        """Removes noble from hand, reversing add_noble"""
+        self.nobles.remove(noble)
+        self.points -= 3
 
     def affordability_check(self, card):
         """Checks if AI has sufficient combination of resources to purchase a card"""
 
         # Apply development card discount with np array
-        purchaseCost = np.array(card.purchaseCost + [0])
+        purchaseCost = card.cost
         playerResources = np.array(self.count_wealth())
         effective_wealth = np.array(self.tokens)
 
@@ -131,7 +192,7 @@ class Player:
         # Behaviour modification #1 - Memory limitation
         if self.ai_type == 1:
             # Incoporate some variance to this figure
-            how_tired_am_i = 5 + random.randint(0, 4)
+            how_tired_am_i = 5 + int(self.rng.integers(0, 5))
             dealt = dealt[:how_tired_am_i]
 
         for card in dealt:
@@ -146,13 +207,13 @@ class Player:
     def get_faceup_cards(self, gamestate):
         """Return all development cards in play"""
         faceup_cards = [card for tier in gamestate.development_cards[1]
-                        for card in tier if tier.index(card) != 0]
+                        for card in tier[1:]]
         return faceup_cards
 
     def get_facedown_cards(self, gamestate):
         """Return all development cards in play"""
         facedown_cards = [card for tier in gamestate.development_cards[1]
-                          for card in tier if tier.index(card) == 0]
+                          for card in tier[:1]]
         return facedown_cards
 
     def get_w_noble(self, gamestate):
@@ -160,73 +221,52 @@ class Player:
 
         # Behaviour modification #2 - Strategy reshuffle
         shuffle_weights = False
-        if self.ai_type == 1 and random.randint(0, 100) <= 1:
+        if self.ai_type == 1 and self.rng.integers(0, 101) <= 1:
             shuffle_weights = True
 
-        w_noble = {}
-        for noble in gamestate.noble_cards[1]:
-            pr = noble.prerequisites + [0]
-            r = self.count_wealth()
-            if len(self.cards) == 0 or shuffle_weights:
-                # Artificially skew weighting before first card bought
-                w_noble[noble] = np.random.gamma(
-                    1, settings.NOBLE_WEIGHT_FACTOR)
-            else:
-                # Calculate w_noble
-                distance = self.get_euclidian_distance(pr, r)
-                w_noble[noble] = 1/(1+distance)
-        return w_noble
-
-    def get_w_card(self, gamestate, cards):
-        """Calculate development card weight vector"""
-
-        w_card = {}
-        for i in range(len(cards)):
-            # Calculate w_card
-            card = cards[i]
-            cp = card.pointValue * 0.2  # Scale point value between 0 and 1
-            c = np.array(card.purchaseCost + [0])
-            r = np.array(self.count_wealth()) + np.array(self.tokens)
-            cg = card.gemType
-            pc = list(self.probabilities.values())[
-                settings.RESOURCE_COLOURS.index(cg)]
-            wcg = 0
-            for noble in gamestate.noble_cards[1]:
-                if noble.prerequisites[settings.RESOURCE_COLOURS.index(cg)] > 0:
-                    wcg += self.w_noble[noble]
-
-            d = self.get_euclidian_distance(c, r)
-            w_card[card] = cp+wcg/1+(d*pc)
-
-        # Return sorted for convenience
-        w_card = dict(
-            sorted(w_card.items(), key=lambda item: item[1], reverse=True))
-
-        return w_card
-
-    def get_w_token(self, gamestate):
-        """Calculate token weight vector"""
-
-        w_token = {}
-        count = 0
-
-        # Count weights of in play development cards
-        for tier in gamestate.development_cards[1]:
-            for card in tier[1:5]:
-                c = np.array(card.purchaseCost)/card.level
-                w_c = self.w_card[card]
-                count += c*w_c
-
-        # Count weights of reserved development cards
-        for card in self.reservations:
-            c = np.array(card.purchaseCost)/card.level
-            w_c = self.w_card_r[card]
-            count += c*w_c
-
-        for gem in settings.RESOURCE_TYPES[:5]:
-            w_token[gem] = count[settings.RESOURCE_TYPES.index(gem)]
-
-        return w_token
+        nobles = gamestate.noble_cards[1]
+        if len(self.cards) == 0 or shuffle_weights:
+            # Artificially skew weighting before first card bought
+            weights = self.rng.gamma(
+                1, settings.NOBLE_WEIGHT_FACTOR, len(nobles)).tolist()
+        else:
+            # Calculate w_noble from the process-wide table of noble distances
+            weights = [1/(1+catalog.noble_proximity(noble, self.bonuses)[0]) for noble in nobles]
+        return dict(zip(nobles, weights))
+
+    def split_w_card(self, w, card_groups):
+        """Split a flat list of card weights into one weight vector per group"""
+        w_cards = []
+        start = 0
+        for group in card_groups:
+            # Return sorted for convenience
+            weights = zip(group, w[start:start + len(group)])
+            w_cards.append(dict(sorted(weights, key=itemgetter(1), reverse=True)))
+            start += len(group)
+        return w_cards
+
+    def weight_columns(self):
+        """Return this player's columns of the card weighing matrix, and |r|^2"""
+
+        # Player resources, and the noble weight of each gem type
+        r = [bonus + token for bonus, token in zip(self.bonuses, self.tokens)]
+        wcg = [0, 0, 0, 0, 0]
+        for noble, w in self.w_noble.items():
+            for gem, prerequisite in enumerate(noble.prerequisites):
+                if prerequisite > 0:
+                    wcg[gem] += w
+
+        # Column 0 - squared distance to the card cost, less |r|^2, as |cost|^2 - 2 cost.r
+        # Column 1 - point value and noble weight, column 2 - colour probability
+        distance = [0.0] * catalog.ROW_WIDTH
+        distance[catalog.ROW_COST] = [-2.0 * i for i in r]
+        distance[catalog.ROW_COST_SQUARED] = 1.0
+        value = [0.0] * catalog.ROW_WIDTH
+        value[catalog.ROW_POINTS] = 0.2
+        value[catalog.ROW_GEM] = wcg
+        colour = [0.0] * catalog.ROW_WIDTH
+        colour[catalog.ROW_GEM] = list(self.probabilities.values())
+        return [distance, value, colour], sum(i * i for i in r)
 
     # def calculate_similarity(self, gamestate):
     #     """Score similarity with AI player"""
@@ -255,24 +295,32 @@ class Player:
 
     #     # print(self.w_token)
 
-    def get_weights(self, gamestate):
-        # Step 1 - Get noble weights
-        self.w_noble = self.get_w_noble(gamestate)
+    def update_noble_weights(self, gamestate):
+        """Refresh probabilities and noble weights, returning whether card weights are stale"""
+        board = gamestate.board_version
+        hand = (tuple(self.tokens), tuple(self.bonuses), tuple(self.reservations))
+        stale = board != self.weights_board or hand != self.weights_hand
+
+        # Step 1 - Probabilities change as cards are dealt, or every turn with limited memory
+        if board != self.weights_board or self.ai_type == 1:
+            probabilities = self.probabilities
+            self.get_probabilities(gamestate.dealt)
+            stale = stale or self.probabilities != probabilities
 
-        # Step 2 - Get weights for affordable development cards
-        faceup_cards = self.get_faceup_cards(gamestate)
-        facedown_cards = self.get_facedown_cards(gamestate)
-        self.w_card = self.get_w_card(gamestate, faceup_cards)
-        self.w_card_fd = self.get_w_card(gamestate, facedown_cards)
-        self.w_card_r = self.get_w_card(gamestate, self.reservations)
+        # Step 2 - Noble weights are random before the first card is bought or when reshuffled
+        if stale or self.ai_type == 1 or len(self.cards) == 0:
+            w_noble = self.w_noble
+            self.w_noble = self.get_w_noble(gamestate)
+            stale = stale or self.w_noble != w_noble
 
-        # Step 3 - Calculate token weights
-        self.w_token = self.get_w_token(gamestate)
+        self.weights_board = board
+        self.weights_hand = hand
+        return stale
 
 
 class AI(Player):
-    def __init__(self, id, name, tokens, cards, reservations, nobles, ai_type):
-        super().__init__(id, name, tokens, cards, reservations, nobles)
+    def __init__(self, id, name, tokens, cards, reservations, nobles, ai_type, rng=None):
+        super().__init__(id, name, tokens, cards, reservations, nobles, rng)
         self.ai_type = ai_type
         # self.targetNoble = None
 
@@ -290,79 +338,62 @@ class AI(Player):
     def calculate_token_selection(self, gamestate, weights):
         """Calculate combination of tokens to pick up based on weights"""
 
-        stack = [0, 0, 0, 0, 0, 0]
         current_player_id = gamestate.turn % len(gamestate.players)
         round_number = math.floor(gamestate.turn / len(gamestate.players)) + 1
 
-        # Sort weights by token type
-        sorted_token_weights = dict(
-            sorted(weights.items(), key=lambda item: item[1], reverse=True))
-
-        # Which tokens are available?
-        available_tokens = gamestate.token_pool[:6]
-
-        # Remove gemtypes which are not available
-        null_gem_indices = []
-        for i in range(5):
-            if available_tokens[i] == 0:
-                null_gem_indices.append(i)
-        for null_gem_index in null_gem_indices:
-            gem_type_from_index = settings.RESOURCE_TYPES[null_gem_index]
-            del sorted_token_weights[gem_type_from_index]
+        # Token weights and availability as vectors
+        token_weights = np.array([float(weights[gem]) for gem in settings.RESOURCE_TYPES[:5]])
+        available_tokens = np.array(gamestate.token_pool[:5])
+        available = available_tokens > 0
+        capacity = 10 - sum(self.tokens)
 
         # Determine if favoured gem type exists
-        favoured_gem_type = None
-        favoured_gem_type_index = 0
+        favoured_gem_type_index = None
         favoured_gem_multiplier = 1.25
         if self.ai_type == 0:
             favoured_gem_multiplier += 0.5
 
-        favoured_token_threshold = np.mean(list(sorted_token_weights.values(
-        ))) + (favoured_gem_multiplier * np.std(list(sorted_token_weights.values())))
-
         # Check if there are sufficient tokens remaining to make this comparison
-        if len(sorted_token_weights) >= 2:
-            if list(sorted_token_weights.items())[0][1] >= favoured_token_threshold:
-                favoured_gem_type = list(sorted_token_weights.items())[0]
-                favoured_gem_type_index = settings.RESOURCE_TYPES.index(
-                    favoured_gem_type[0])
-
-        if favoured_gem_type is not None and available_tokens[favoured_gem_type_index] >= 4:
+        if np.count_nonzero(available) >= 2:
+            available_weights = token_weights[available]
+            favoured_token_threshold = np.mean(available_weights) + \
+                (favoured_gem_multiplier * np.std(available_weights))
+            best_gem = int(np.argmax(np.where(available, token_weights, -np.inf)))
+            if token_weights[best_gem] >= favoured_token_threshold:
+                favoured_gem_type_index = best_gem
+
+        if favoured_gem_type_index is not None and available_tokens[favoured_gem_type_index] >= 4:
             # Pick up two of a colour
             gamestate.game_summary.risk_data[current_player_id]["R5"] += 1
-            gem_type_to_pick_up = list(sorted_token_weights.items())[0]
-            gem_to_pick_up = settings.RESOURCE_TYPES.index(
-                gem_type_to_pick_up[0])
             if sum(self.tokens) <= 8:
-                if isinstance(self, AI):
-                    gamestate.game_summary.turn_data[self.id][round_number] = "T2"
-                stack[gem_to_pick_up] += 2
+                gamestate.game_summary.turn_data[self.id][round_number] = "T2"
+                pick = moves.DOUBLE_PICK_ROWS[favoured_gem_type_index]
             else:
-                stack[gem_to_pick_up] += 1
-        elif len(sorted_token_weights) >= 2 and sum(self.tokens) <= 7:
-            # Pick up three best weighted gems
-            gems_to_pick_up = list(sorted_token_weights.items())[:3]
-            for gem in gems_to_pick_up:
-                gem_to_pick_up = settings.RESOURCE_TYPES.index(gem[0])
-                if isinstance(self, AI):
-                    gamestate.game_summary.turn_data[self.id][round_number] = "T3"
-                stack[gem_to_pick_up] += 1
+                pick = moves.SINGLE_PICK_ROWS[favoured_gem_type_index]
         else:
-            # Pick up best weighted gem until no longer can
-            picked_up = 0
-            for gem in sorted_token_weights.keys():
-                gem_to_pick_up = settings.RESOURCE_TYPES.index(gem)
-                if (sum(self.tokens) + picked_up) < 10:
-                    picked_up += 1
-                    stack[gem_to_pick_up] += 1
+            if np.count_nonzero(available) >= 2 and sum(self.tokens) <= 7:
+                gamestate.game_summary.turn_data[self.id][round_number] = "T3"
+
+            # Mask out picks the pool or token limit do not allow, then take the best weighted
+            legal = np.all(moves.TOKEN_PICKS[:, :5] <= available_tokens, axis=1) & \
+                (moves.TOKEN_PICK_SIZES <= capacity) & ~moves.TOKEN_PICK_DOUBLES
+            if not legal.any():
+                return [0, 0, 0, 0, 0, 0]
+            # Rounded so that equal sums tie and the lowest gem index wins, as in a stable sort
+            scores = np.where(legal, np.round(moves.TOKEN_PICKS[:, :5] @ token_weights, 9), -np.inf)
+            pick = int(np.argmax(scores))
 
-        return stack
+        return moves.TOKEN_PICKS[pick].tolist()
 
     def acquire_tokens(self, gamestate, weights, current_player_id, UI):
         """Perform AI action of acquiring tokens"""
 
         # Determine combination of tokens to pick up
         stack = self.calculate_token_selection(gamestate, weights)
+        self.pick_up_tokens(gamestate, stack, current_player_id, UI)
+
+    def pick_up_tokens(self, gamestate, stack, current_player_id, UI):
+        """Move a chosen stack of tokens from the pool to the AI"""
 
         # Remove picked up tokens from token pool
         subtracted_pool = []
@@ -382,7 +413,7 @@ class AI(Player):
                     str(stack[i]) + "x " + \
                     settings.RESOURCE_TYPES[i] + " token"
         string = string + "."
-        if not TESTING_MODE:
+        if not TESTING_MODE and UI is not None:
             UI.display_message(
                 "> Player " + str(current_player_id + 1) + " (AI) picked up:" + string)
 
@@ -397,7 +428,7 @@ class AI(Player):
         cardToAcquire = list(sorted_cards.items())[0][0]
 
         # Add card to player hand
-        gamestate.players[current_player_id].cards.append(cardToAcquire)
+        gamestate.players[current_player_id].add_card(cardToAcquire)
 
         # Find index of card to acquire
         level = cardToAcquire.level
@@ -418,7 +449,7 @@ class AI(Player):
             # Remove it from reservations
             del(self.reservations[index])
 
-        purchase_cost = np.array(cardToAcquire.purchaseCost + [0])
+        purchase_cost = cardToAcquire.cost
         player_resources = np.array(self.count_wealth())
         player_wealth = np.array(self.tokens)
         effective_cost = purchase_cost - player_resources
@@ -435,16 +466,16 @@ class AI(Player):
             net_cost_mask = np.array([i if i < 0 else 0 for i in net_cost])
             price_paid = effective_cost + net_cost_mask
 
-            gamestate.token_pool = list(price_paid + token_pool)
+            gamestate.token_pool = (price_paid + token_pool).tolist()
             # Add gold tokens back to game
-            gamestate.token_pool[5] += abs(costOverflow)
+            gamestate.token_pool[5] += int(abs(costOverflow))
 
             # This cannot go below zero; add back gold tokens
-            net_cost = [i if i > 0 else 0 for i in net_cost]
+            net_cost = [int(i) if i > 0 else 0 for i in net_cost]
 
             self.tokens = list(net_cost)
-            self.tokens[5] -= abs(costOverflow)
-            if not TESTING_MODE:
+            self.tokens[5] -= int(abs(costOverflow))
+            if not TESTING_MODE and UI is not None:
                 if calledFrom == "board":
                     UI.display_message(
                         "> Player " + str(current_player_id + 1) + " (AI) acquired a card using gold tokens.")
@@ -452,10 +483,10 @@ class AI(Player):
                     UI.display_message("> Player " + str(current_player_id + 1) +
                                        " (AI) acquired a card from their reservations using gold tokens.")
         else:
-            gamestate.token_pool = list(effective_cost + token_pool)
-            self.tokens = list(player_wealth - effective_cost)
+            gamestate.token_pool = (effective_cost + token_pool).tolist()
+            self.tokens = (player_wealth - effective_cost).tolist()
 
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 if calledFrom == "board":
                     UI.display_message(
                         "> Player " + str(current_player_id + 1) + " (AI) acquired a card.")
@@ -494,49 +525,38 @@ class AI(Player):
         # Gold token logic + display message
         if gold_token_pool > 0:
             if available_capacity > 0:
-                if not TESTING_MODE:
+                if not TESTING_MODE and UI is not None:
                     UI.display_message("> Player " + str(current_player_id + 1) +
                                        " (AI) reserved a card and acquired a gold token.")
                 gamestate.allocate_tokens(
                     current_player_id, [0, 0, 0, 0, 0, 1])
                 gamestate.token_pool[5] -= 1
             else:
-                if not TESTING_MODE:
+                if not TESTING_MODE and UI is not None:
                     UI.display_message("> Player " + str(current_player_id + 1) +
                                        " (AI) reserved a card but did not acquire a gold token as they have reached their token limit.")
         else:
-            if not TESTING_MODE:
+            if not TESTING_MODE and UI is not None:
                 UI.display_message("> Player " + str(current_player_id + 1) +
                                    " (AI) reserved a card but did not acquire a gold token as there are none left.")
 
     def find_index(self, gamestate, card, level, calledFrom):
         """Return the position of a card as it is displayed"""
-        index = 0
-
         if calledFrom == "board":
-            # Check for equivalency to find position of card in flop
-            for i in range(len(gamestate.development_cards[1][level-1])):
-                comparison_card = gamestate.development_cards[1][level-1][i]
-                if card.purchaseCost == comparison_card.purchaseCost and card.gemType == comparison_card.gemType and card.pointValue == comparison_card.pointValue:
-                    index = i
+            cards = gamestate.development_cards[1][level-1]
         else:
-            # Check for equivalency in reservations to get position
-            for i in range(len(self.reservations)):
-                comparison_card = self.reservations[i]
-                if card.purchaseCost == comparison_card.purchaseCost and card.gemType == comparison_card.gemType and card.pointValue == comparison_card.pointValue:
-                    index = i
-        return index
+            cards = self.reservations
+
+        # Cards are shared catalog records, so identity is enough to find the position
+        if card in cards:
+            return cards.index(card)
+        return 0
 
     def noble_requirements_met(self, gamestate, UI):
         """Allows AI to select and acquire noble"""
-        potential_matches = []
-
         # Get list of nobles where prerequisites are met
-        for noble in gamestate.noble_cards[1]:
-            prereqs = np.array(noble.prerequisites + [0])
-            resources = np.array(self.count_wealth())
-            if np.min(resources - prereqs) >= 0:
-                potential_matches.append(noble)
+        potential_matches = [noble for noble in gamestate.noble_cards[1]
+                             if catalog.noble_proximity(noble, self.bonuses)[1]]
 
         # Can influence AI decision on which noble to pick up, but is this important?
 
@@ -544,8 +564,9 @@ class AI(Player):
         if len(potential_matches) > 0:
             card_to_append = potential_matches[0]
             gamestate.noble_cards[1].remove(card_to_append)
-            self.nobles.append(card_to_append)
-            if not TESTING_MODE:
+            gamestate.board_version += 1
+            self.add_noble(card_to_append)
+            if not TESTING_MODE and UI is not None:
                 UI.display_message(
                     "> Player " + str(settings.NUMBER_OF_PLAYERS + (self.id + 1)) + " (AI) has acquired a noble.")
             self.skipNobleCheck = True
@@ -640,6 +661,11 @@ class AI(Player):
         # Is there a card another player really wants? - This gets the most valuable card for each player
         aggressive_reservation_list = self.get_aggressive_reservation_list(gamestate)
         
+        if len(aggressive_reservation_list) > 0:
+            # Work on a copy and recalculate next turn, as the cached weights are changed
+            self.w_card = dict(self.w_card)
+            self.weights_board = None
+
         for player, card in aggressive_reservation_list.items():
             # Assign artificially large values for cards on list
             self.w_card[card] = max(self.w_card.values()) + 1  
@@ -712,27 +738,128 @@ class AI(Player):
             gamestate.game_summary.turn_data[current_player_id][round_number] = "E"
             gamestate.game_summary.errors += 1
 
-    def evaluation(self, gamestate, UI):
+    def searches(self, gamestate):
+        """Check if this turn's move is chosen by search rather than a decision tree"""
+        if gamestate.ai_type in (2, 3, 4):
+            return True
+        return gamestate.ai_type == 1 and settings.ENDGAME_SOLVER and endgame.applies(gamestate)
+
+    def choose_move(self, gamestate, deadline=None, stop=None):
+        """Move chosen by search, or None where the decision trees decide"""
+        if not self.searches(gamestate):
+            return None
+
+        if gamestate.ai_type in (2, 3):
+            action, self.search_stats = self.mcts_search(gamestate, deadline, stop)
+        elif gamestate.ai_type == 4:
+            action, self.search_stats = expectimax.search(gamestate, deadline=deadline, stop=stop)
+        else:
+            # Near the end of the game, play the solved move when it forces a win or avoids a loss
+            action, self.search_stats = endgame.solve(gamestate, deadline=deadline, stop=stop)
+            if not self.search_stats["decisive"]:
+                return None
+        return moves.ACTIONS[action]
+
+    def mcts_search(self, gamestate, deadline, stop):
+        """Monte Carlo tree search, over sampled hidden cards for information set search"""
+        determinizations = settings.MCTS_DETERMINIZATIONS if gamestate.ai_type == 3 else None
+        time_limit = settings.MCTS_TIME_LIMIT
+        if deadline is not None:
+            time_limit = max(0, deadline - time.perf_counter())
+        if settings.MCTS_WORKERS == 1:
+            return mcts.search(gamestate, settings.MCTS_ITERATIONS, time_limit,
+                               determinizations=determinizations, stop=stop)
+        return mcts.parallel_search(gamestate, settings.MCTS_ITERATIONS, time_limit,
+                                    settings.MCTS_WORKERS, determinizations, stop)
+
+    def report_search(self, gamestate, UI):
+        """Displays how much searching went into the move"""
+        if TESTING_MODE or UI is None:
+            return
+        current_player_id = gamestate.turn % len(gamestate.players)
+        if "iterations" in self.search_stats:
+            UI.display_message("> Player " + str(current_player_id + 1) + " (AI) searched " +
+                               str(self.search_stats["iterations"]) + " moves (" +
+                               str(round(self.search_stats["rate"])) + " per second).")
+        else:
+            UI.display_message("> Player " + str(current_player_id + 1) + " (AI) searched " +
+                               str(self.search_stats["nodes"]) + " positions.")
+
+    def perform_move(self, gamestate, move, UI):
+        """Play a move chosen by search through the same actions as the decision trees"""
+        current_player_id = gamestate.turn % len(gamestate.players)
+        round_number = math.floor(gamestate.turn / len(gamestate.players)) + 1
+        kind = move[0]
+
+        if kind == "take":
+            # Action - Pick up tokens
+            if max(move[1]) == 2:
+                gamestate.game_summary.risk_data[current_player_id]["R5"] += 1
+            # Logged by the number of tokens taken, single tokens are not logged by the decision trees either
+            if sum(move[1]) >= 2:
+                gamestate.game_summary.turn_data[current_player_id][round_number] = "T" + str(sum(move[1]))
+            self.pick_up_tokens(gamestate, list(move[1]), current_player_id, UI)
+        elif kind == "buy":
+            # Action - Buy development card
+            card = gamestate.development_cards[1][move[1]][move[2]]
+            self.acquire_card(gamestate, {card: 0}, current_player_id, UI, "board")
+        elif kind == "buy_reserved":
+            # Action - Buy reservation
+            card = self.reservations[move[1]]
+            self.acquire_card(gamestate, {card: 0}, current_player_id, UI, "hand")
+        elif kind == "reserve":
+            # Action - Reserve a card, classified as in GameState.reserve_card, so
+            # blocking an opponent counts as an attacking reservation
+            card = gamestate.development_cards[1][move[1]][move[2]]
+            if move[2] != 0 and gamestate.is_aggressive_reservation(card):
+                gamestate.game_summary.risk_data[current_player_id]["R2"] += 1
+                gamestate.game_summary.turn_data[current_player_id][round_number] = "RA"
+            else:
+                gamestate.game_summary.risk_data[current_player_id]["R1"] += 1
+                gamestate.game_summary.turn_data[current_player_id][round_number] = "RB"
+            if move[2] == 0:
+                gamestate.game_summary.risk_data[current_player_id]["R3"] += 1
+            self.reserve_card(gamestate, {card: 0}, current_player_id, UI)
+        else:
+            # Error - No viable moves
+            gamestate.game_summary.turn_data[current_player_id][round_number] = "E"
+            gamestate.game_summary.errors += 1
+
+    def evaluation(self, gamestate, UI, deadline=None):
         """Main loop for AI control"""
+        if deadline is None and settings.AI_DEADLINE is not None:
+            deadline = time.perf_counter() + settings.AI_DEADLINE
+        self.play(gamestate, UI, self.choose_move(gamestate, deadline))
 
+    def play(self, gamestate, UI, move):
+        """Plays a move chosen by search, or the decision tree's move if there is none"""
 
         # Get gamestate information and weights
         # self.get_probabilities(gamestate.dealt)
         # self.get_weights(gamestate)
 
-        # Calculate weights for all players
-        for player in gamestate.players:
-            player.get_probabilities(gamestate.dealt)
-            player.get_weights(gamestate)
-            player.get_desired_types()
-
-        affordable_cards, affordable_reservations = self.get_all_affordable_cards()
-
-        # Call different decision tree based on AI setting
-        if gamestate.ai_type == 0:
-            self.standard_ai(gamestate, UI, affordable_cards, affordable_reservations)
+        # Early token picks of the decision trees come from the opening book, when it has the position.
+        # A book move is only a lookup, so it is played before any weights are brought up to date
+        book_move = None
+        if move is None and settings.OPENING_BOOK and gamestate.ai_type in settings.OPENING_BOOK_AI_TYPES:
+            book_move = book.lookup(gamestate)
+
+        if book_move is not None:
+            self.perform_move(gamestate, book_move, UI)
+        elif move is not None:
+            # Weights for all players, shared with the session log for the rest of the turn
+            gamestate.refresh_weights()
+            self.report_search(gamestate, UI)
+            self.perform_move(gamestate, move, UI)
         else:
-            self.modified_ai(gamestate, UI, affordable_cards, affordable_reservations)
+            gamestate.refresh_weights()
+            affordable_cards, affordable_reservations = self.get_all_affordable_cards()
+
+            # Call different decision tree based on AI setting
+            if gamestate.ai_type == 0:
+                self.standard_ai(gamestate, UI, affordable_cards, affordable_reservations)
+            else:
+                self.modified_ai(gamestate, UI, affordable_cards, affordable_reservations)
 
         # Set to true to watch AI take turns live. It's great fun...!
         if False:
@@ -20,8 +20,46 @@ TESTING_MODE = False
 NOBLE_WEIGHT_FACTOR = 1
 TERMINATE_AFTER_LOOP = 50
 EPOCHS = 5
+SIMULATION_WORKERS = 1 # Worker processes for simulations, None uses every core
+SIMULATION_SEED = 0
+BATCH_SIMULATION = False # Play standard AI simulations in lockstep as arrays
+BATCH_SIZE = 5000
 
 PROCESS_DATA = False
-AI_TYPE = 0
+AI_TYPE = 0 # 0 - standard, 1 - modified, 2 - Monte Carlo tree search, 3 - information set search, 4 - expectimax
 SELECT_AI_TYPE_RANDOMLY = False
-GATHER_AI_DATA_TYPE = 0
\ No newline at end of file
+GATHER_AI_DATA_TYPE = 0
+
+# Seconds an AI has to choose a move, e.g. 0.2 for human games or 0.002 for bulk simulation.
+# Searches return their best move so far when it passes. None for no limit
+AI_DEADLINE = None
+
+# Search the AI's replies to a human's likely moves during the human's turn
+PONDER = True
+PONDER_MOVES = 4
+
+# Search budget of Monte Carlo tree search AI, whichever runs out first. AI_DEADLINE replaces
+# the time limit when set
+MCTS_ITERATIONS = 2000
+MCTS_TIME_LIMIT = 2.0 # Seconds
+MCTS_WORKERS = 1 # Processes searching in parallel, None for one per core
+MCTS_DETERMINIZATIONS = 256 # Hidden card samples drawn at once by information set search
+
+# Turns searched by the expectimax AI, and positions kept between its searches
+EXPECTIMAX_DEPTH = 2
+TRANSPOSITION_TABLE_SIZE = 2 ** 18
+
+# Modified AI solves the rest of the round exactly once a player is this close to victory
+ENDGAME_SOLVER = True
+ENDGAME_MARGIN = 5 # Points
+ENDGAME_TURNS = 2 # Turns left in the round
+ENDGAME_TABLE_SIZE = 2 ** 18
+
+# Decision tree AIs look up their token picks in the first rounds in a book built from their
+# own self-play. Off by default, as book moves replace the tree's own choices in the collected statistics
+OPENING_BOOK = False
+OPENING_BOOK_AI_TYPES = (0, 1) # AI types with entries of their own in the book
+OPENING_BOOK_PATH = "data/opening_book.npy"
+OPENING_BOOK_ROUNDS = 3
+BUILD_OPENING_BOOK = False # Rebuild the book from self-play instead of running a session
+OPENING_BOOK_GAMES = 2000 # Self-play games per player count
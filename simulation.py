@@ -0,0 +1,64 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+simulation.py - Plays games between AI players without creating a UI
+"""
+
+import settings
+import gamestate
+import random, os, sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+def select_ai_type(rng=random):
+    """Select AI type randomly or from settings"""
+    if settings.SELECT_AI_TYPE_RANDOMLY:
+        return rng.randint(0, 1)
+    return settings.AI_TYPE
+
+
+def simulate_game(ai_type, n_players=None, seed=None):
+    """Play a single AI-only game to completion and return its summary"""
+    if n_players is None:
+        n_players = settings.NUMBER_OF_AI_PLAYERS
+
+    game = gamestate.GameState(0, n_players, ai_type, seed)
+
+    # No UI is passed, so no tkinter root or widgets are ever created
+    game.start_game(None)
+
+    return game.game_summary
+
+
+def game_seed(seed, index):
+    """Derive an independent seed for a game from the run seed and its index"""
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+def simulate_seeded_game(seed, index, n_players=None):
+    """Play the game at a given index of a seeded run"""
+    game_seed_value = game_seed(seed, index)
+    ai_type = select_ai_type(random.Random(game_seed_value))
+    return simulate_game(ai_type, n_players, game_seed_value)
+
+
+def run_games(n_games, workers=None, seed=None, n_players=None):
+    """Play n games across a pool of worker processes, yielding summaries in game order"""
+    if workers is None:
+        workers = settings.SIMULATION_WORKERS or os.cpu_count()
+    if seed is None:
+        seed = settings.SIMULATION_SEED
+
+    if workers == 1 or getattr(sys, "frozen", False):
+        # No pool, play in this process. A frozen executable would relaunch itself in every worker
+        for index in range(n_games):
+            yield simulate_seeded_game(seed, index, n_players)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Games are short, so hand them out in chunks to keep inter-process traffic down
+        chunksize = max(1, n_games // (workers * 16))
+        yield from executor.map(simulate_seeded_game, [seed] * n_games, range(n_games),
+                                [n_players] * n_games, chunksize=chunksize)
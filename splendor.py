@@ -8,20 +8,16 @@ splendor.py - Launches application and performs session analysis
 
 import tkinter as tk
 import matplotlib
-import gamestate, UI, settings
+import gamestate, UI, settings, simulation, batch, book
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
-import pickle, random, time, os
+import pickle, time, os, multiprocessing
 import numpy as np
 
 class Splendor:
     def __init__(self, root):
 
-        # Select AI type randomly
-        if settings.SELECT_AI_TYPE_RANDOMLY:
-            ai_type = random.randint(0, 1)
-        else:
-            ai_type = settings.AI_TYPE
+        ai_type = simulation.select_ai_type()
 
         self.gamestate = gamestate.GameState(
             settings.NUMBER_OF_PLAYERS, 
@@ -209,10 +205,11 @@ def run_simulation():
     risk_count = 0
     errors = 0
     total_turns = 0
-    for i in range(settings.EPOCHS):
-        print("Simulating game", i+1, "of", settings.EPOCHS)
-        start()
-        game_summary = game.gamestate.game_summary
+
+    # Games are played in parallel, each from its own seed, and collated in order
+    game_summaries = simulation.run_games(settings.EPOCHS, settings.SIMULATION_WORKERS)
+    for i, game_summary in enumerate(game_summaries):
+        print("Simulated game", i+1, "of", settings.EPOCHS)
         if game_summary.game_completed == True:
 
             round_count.append(game_summary.rounds)
@@ -225,8 +222,8 @@ def run_simulation():
             for move_number, action in game_summary.turn_data[ID_TO_LOG].items():
                 turn_data.append((move_number, action))
 
-            errors += game.gamestate.game_summary.errors
-            total_turns += game.gamestate.game_summary.rounds
+            errors += game_summary.errors
+            total_turns += game_summary.rounds
         else:
             failed_games += 1
     gcr = (len(round_count) / settings.EPOCHS) * 100
@@ -244,6 +241,45 @@ def run_simulation():
 
 
 
+def run_batch_simulation():
+    """Execute automated simulation of standard AI games in lockstep batches"""
+
+    # Only the standard AI's decision tree is played in batches
+    if settings.AI_TYPE != 0 or settings.SELECT_AI_TYPE_RANDOMLY:
+        print("Batch simulation only plays the standard AI, simulating games one by one instead.")
+        run_simulation()
+        return
+
+    round_count = []
+    turn_data = []
+    risk_count = 0
+    errors = 0
+    for start in range(0, settings.EPOCHS, settings.BATCH_SIZE):
+        n_games = min(settings.BATCH_SIZE, settings.EPOCHS - start)
+        print("Simulating games", start + 1, "to", start + n_games, "of", settings.EPOCHS)
+        games = batch.BatchSimulation(n_games, settings.NUMBER_OF_AI_PLAYERS,
+                                      seed=(settings.SIMULATION_SEED, start)).run()
+        round_count += games.round_count()
+        turn_data += games.turn_data()
+        risk_count += games.risk_count()
+        errors += games.error_count()
+    gcr = (len(round_count) / settings.EPOCHS) * 100
+
+    if len(round_count) == 0:
+        print("Game completion rate =", gcr, "%", "Failed games:", settings.EPOCHS)
+        return
+
+    epr = (errors / sum(round_count)) * 100
+    print("Game completion rate =", gcr, "%",
+          "Total errors", errors, "Error rate:", epr, "%", "Failed games:", settings.EPOCHS - len(round_count))
+    graph_turn_distribution(turn_data, max(round_count))
+    graph_round_count(round_count)
+    print("Risk count = "+ str(risk_count))
+    print("Average risk/game = "+ str(risk_count / settings.EPOCHS))
+
+    plt.show()
+
+
 def run_scenario():
     """Play a game featuring a human player"""
     # Need to pass params here. AI type, number of AI players, etc.
@@ -266,6 +302,7 @@ def run_scenario():
     # Create game summary dictionary object
     session_log = {}
     session_log["ai_type"] = game_summary.ai_type
+    session_log["seed"] = game_summary.seed
     session_log["turn_data"] = game_summary.turn_data
     session_log["risk_data"] = game_summary.risk_data
     session_log["rounds"] = game_summary.rounds
@@ -384,6 +421,9 @@ def process_data():
 
 
 if __name__ == "__main__":
+    # Worker processes of the frozen executable run their task here instead of the application
+    multiprocessing.freeze_support()
+
     print("=*=*=*=*=*=*=*=*=*=ENVIRONMENT=*=*=*=*=*=*=*=*=*=")
     print('tkinter: {}'.format(tk.TkVersion))
     print('matplotlib: {}'.format(matplotlib.__version__))
@@ -392,11 +432,18 @@ if __name__ == "__main__":
 
     if settings.PROCESS_DATA:
         process_data()
+    elif settings.BUILD_OPENING_BOOK:
+        print("Building opening book...")
+        entries = book.build(settings.OPENING_BOOK_GAMES, seed=settings.SIMULATION_SEED).shape[1]
+        print("{} positions saved to {}".format(entries, settings.OPENING_BOOK_PATH))
     else:
         # If no human players in game, run AI simulation
         if settings.NUMBER_OF_PLAYERS == 0:
             # Params: Number of times to run,
-            run_simulation()
+            if settings.BATCH_SIMULATION:
+                run_batch_simulation()
+            else:
+                run_simulation()
         else:
             print("Launching game window...")
             run_scenario()
@@ -47,4 +47,127 @@ def test_reserve_card(test_ai, test_gamestate, test_card):
   """Add card to AI player hand"""
   player.AI.reserve_card(test_ai, test_gamestate, [test_card], {}, 0, None)
   assert len(test_gamestate.players[0].reservations) == 1
-   
\ No newline at end of file
+   
+@pytest.mark.parametrize("tokens, pool, expected", [
+  ([0, 0, 0, 0, 0, 0], [4, 4, 4, 4, 4, 5], [0, 0, 1, 1, 1, 0]),
+  ([0, 0, 0, 0, 0, 0], [4, 4, 4, 0, 0, 5], [1, 1, 1, 0, 0, 0]),
+  ([2, 2, 2, 2, 0, 0], [4, 4, 4, 4, 4, 5], [0, 0, 0, 1, 1, 0]),
+  ([3, 3, 3, 0, 0, 0], [4, 4, 4, 0, 0, 5], [0, 0, 1, 0, 0, 0]),
+])
+def test_token_pick_table(tokens, pool, expected):
+  """Best legal pick from the precomputed table is masked by pool and token limit"""
+  test_gamestate = gamestate.GameState(0, 2, 0)
+  test_gamestate.token_pool = pool
+  ai = test_gamestate.players[0]
+  ai.tokens = tokens
+  weights = {"Onyx": 1, "Sapphire": 1.5, "Emerald": 2, "Ruby": 2.5, "Diamond": 3}
+  assert player.AI.calculate_token_selection(ai, test_gamestate, weights) == expected
+
+def test_token_pick_favoured_double():
+  """A strongly favoured gem is picked up as a double"""
+  test_gamestate = gamestate.GameState(0, 2, 0)
+  ai = test_gamestate.players[0]
+  weights = {"Onyx": 0, "Sapphire": 0, "Emerald": 10, "Ruby": 0, "Diamond": 0}
+  assert player.AI.calculate_token_selection(ai, test_gamestate, weights) == [0, 0, 2, 0, 0, 0]
+  assert test_gamestate.game_summary.risk_data[0]["R5"] == 1
+
+def test_batched_card_weights():
+  """Weights from one batch over the board match the per card formula"""
+  test_gamestate = gamestate.GameState(0, 2, 0)
+  ai = test_gamestate.players[0]
+  ai.add_card(test_gamestate.development_cards[0][0][0])
+  ai.tokens = [1, 0, 2, 0, 1, 1]
+  ai.reservations = [test_gamestate.development_cards[0][1][0]]
+  ai.get_probabilities(test_gamestate.dealt)
+  ai.w_noble = ai.get_w_noble(test_gamestate)
+  player.weigh_cards(test_gamestate, [ai])
+
+  pc = list(ai.probabilities.values())
+  r = np.array(ai.count_wealth()) + np.array(ai.tokens)
+  for cards, w_card in [(ai.get_faceup_cards(test_gamestate), ai.w_card),
+                        (ai.get_facedown_cards(test_gamestate), ai.w_card_fd),
+                        (ai.reservations, ai.w_card_r)]:
+    assert list(w_card.values()) == sorted(w_card.values(), reverse=True)
+    for card in cards:
+      wcg = sum(w for noble, w in ai.w_noble.items() if noble.prerequisites[card.gem] > 0)
+      expected = card.pointValue * 0.2 + wcg + np.linalg.norm(card.cost - r) * pc[card.gem]
+      assert w_card[card] == pytest.approx(expected)
+
+  count = sum(card.cost[:5] / card.level * ai.w_card[card] for card in ai.get_faceup_cards(test_gamestate)) + \
+    ai.reservations[0].cost[:5] / ai.reservations[0].level * ai.w_card_r[ai.reservations[0]]
+  assert list(ai.w_token.values()) == pytest.approx(list(count))
+
+def test_refresh_weights_cache():
+  """Weights are only recalculated after an event that affects them"""
+  test_gamestate = gamestate.GameState(0, 2, 0)
+  ai = test_gamestate.players[0]
+  ai.add_card(test_gamestate.development_cards[0][0][0])
+  test_gamestate.refresh_weights()
+  w_card = ai.w_card
+
+  # Another player's tokens do not affect this player
+  test_gamestate.players[1].tokens = [1, 1, 1, 0, 0, 0]
+  test_gamestate.turn += 1
+  test_gamestate.refresh_weights()
+  assert ai.w_card is w_card
+
+  # Own tokens do
+  ai.tokens = [1, 1, 1, 0, 0, 0]
+  test_gamestate.turn += 1
+  test_gamestate.refresh_weights()
+  assert ai.w_card is not w_card
+  w_card = ai.w_card
+
+  # As does a change to the board
+  board_version = test_gamestate.board_version
+  test_gamestate.apply_move(("reserve", 0, 1))
+  assert test_gamestate.board_version != board_version
+  test_gamestate.refresh_weights()
+  assert ai.w_card is not w_card
+  cached = ai.w_card
+  player.weigh_cards(test_gamestate, [ai])
+  assert cached == pytest.approx(ai.w_card)
+
+def test_searched_reservation_classified():
+  """Reservations chosen by search are logged as attacking when the card is valuable to a player"""
+  kinds = []
+  for slot in range(1, 5):
+    test_gamestate = gamestate.GameState(0, 2, 1, seed=2)
+    test_gamestate.refresh_weights()
+    card = test_gamestate.development_cards[1][2][slot]
+    aggressive = test_gamestate.is_aggressive_reservation(card)
+    kinds.append(aggressive)
+    test_gamestate.players[0].perform_move(test_gamestate, ("reserve", 2, slot), None)
+    risks = test_gamestate.game_summary.risk_data[0]
+    assert (risks["R2"], risks["R1"]) == ((1, 0) if aggressive else (0, 1))
+    assert test_gamestate.game_summary.turn_data[0][1] == ("RA" if aggressive else "RB")
+  assert True in kinds and False in kinds
+
+@pytest.mark.parametrize("stack, logged, risky", [
+  ((1, 1, 1, 0, 0, 0), "T3", 0),
+  ((2, 0, 0, 0, 0, 0), "T2", 1),
+  ((1, 1, 0, 0, 0, 0), "T2", 0),
+  ((1, 0, 0, 0, 0, 0), None, 0),
+])
+def test_searched_token_pick_logged(stack, logged, risky):
+  """Token picks chosen by search are logged by the number of tokens taken"""
+  test_gamestate = gamestate.GameState(0, 2, 2, seed=0)
+  test_gamestate.players[0].perform_move(test_gamestate, ("take", stack), None)
+  assert test_gamestate.game_summary.turn_data[0].get(1) == logged
+  assert test_gamestate.game_summary.risk_data[0]["R5"] == risky
+  assert test_gamestate.players[0].tokens == list(stack)
+
+def test_batch_weights_match_single():
+  """Weighing several players in one batch gives each the weights they would get alone"""
+  test_gamestate = gamestate.GameState(0, 3, 0, seed=5)
+  for i, ai in enumerate(test_gamestate.players):
+    ai.tokens = [i, 1, 0, 2, 0, 0]
+    ai.reservations = test_gamestate.development_cards[0][i][:i]
+    ai.update_noble_weights(test_gamestate)
+  player.weigh_cards(test_gamestate, test_gamestate.players)
+  batched = [(ai.w_card, ai.w_card_fd, ai.w_card_r, ai.w_token) for ai in test_gamestate.players]
+  for ai, weights in zip(test_gamestate.players, batched):
+    player.weigh_cards(test_gamestate, [ai])
+    for single, batch in zip((ai.w_card, ai.w_card_fd, ai.w_card_r, ai.w_token), weights):
+      assert list(single) == list(batch)
+      assert list(single.values()) == pytest.approx(list(batch.values()))
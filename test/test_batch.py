@@ -0,0 +1,47 @@
+import settings
+settings.TESTING_MODE = True
+
+import batch
+import numpy as np
+import pytest
+
+@pytest.fixture
+def finished_batch():
+  return batch.BatchSimulation(64, 2, seed=3).run()
+
+def test_remove_at():
+  """Removed entries close up to the left and leave empty slots at the end"""
+  rows = np.array([[1, 2, 3, 4], [5, 6, 7, batch.EMPTY]])
+  removed = batch.remove_at(rows, np.array([1, 0]))
+  assert removed.tolist() == [[1, 3, 4, batch.EMPTY], [6, 7, batch.EMPTY, batch.EMPTY]]
+
+def test_tokens_conserved(finished_batch):
+  """Tokens only ever move between the pool and players"""
+  totals = finished_batch.token_pool.sum(axis=1) + finished_batch.tokens.sum(axis=(1, 2))
+  assert np.all(totals == 4 * 5 + 5)
+  assert np.all(finished_batch.tokens >= 0) and np.all(finished_batch.token_pool >= 0)
+
+def test_cards_accounted_for(finished_batch):
+  """Every card is on the board, in a deck, held or reserved exactly once"""
+  bought = finished_batch.n_cards.sum(axis=1)
+  board = (finished_batch.board != batch.EMPTY).sum(axis=(1, 2))
+  decks = (finished_batch.deck_size - finished_batch.deck_top).sum(axis=1)
+  reserved = (finished_batch.reservations != batch.EMPTY).sum(axis=(1, 2))
+  assert np.all(bought + board + decks + reserved == 90)
+
+def test_results_for_graphs(finished_batch):
+  """Results are in the form the graph functions take"""
+  round_count = finished_batch.round_count()
+  turn_data = finished_batch.turn_data()
+  assert len(round_count) == finished_batch.completed.sum() > 0
+  assert all(rounds > 0 for rounds in round_count)
+  assert all(1 <= turn <= max(round_count) and action in batch.ACTIONS[1:] for turn, action in turn_data)
+  assert np.all(finished_batch.points[finished_batch.completed].max(axis=1) >= settings.VICTORY_POINTS_REQUIRED)
+  errors = sum(action == "E" for _, action in finished_batch.turn_data())
+  assert finished_batch.error_count() >= errors
+
+def test_seeded_batches_repeat():
+  """The same seed plays the same games"""
+  first = batch.BatchSimulation(16, 3, seed=5).run()
+  second = batch.BatchSimulation(16, 3, seed=5).run()
+  assert np.array_equal(first.actions, second.actions)
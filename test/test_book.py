@@ -0,0 +1,81 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import book
+import moves
+import player
+import simulation
+import numpy as np
+import pytest
+
+@pytest.fixture
+def test_book(tmp_path):
+  """Small book from one player self-play, memory mapped as in play"""
+  path = str(tmp_path / "book.npy")
+  book.build(500, ai_types=(0,), player_counts=(1,), path=path)
+  return np.load(path, mmap_mode="r")
+
+def test_book_is_sorted(test_book):
+  """Keys are sorted for binary search, with a token pick under each"""
+  assert test_book.shape[1] > 0
+  keys = test_book[0]
+  assert np.all(keys[1:] > keys[:-1])
+  assert all(moves.ACTIONS[int(action)][0] == "take" for action in test_book[1])
+
+def test_lookup_plays_legal_picks(test_book):
+  """Book moves found in the opening of a new game are legal token picks"""
+  found = 0
+  for seed in range(40):
+    gs = gamestate.GameState(0, 1, 0, seed=seed)
+    move = book.lookup(gs, test_book)
+    if move is not None:
+      found += 1
+      assert move[0] == "take"
+      assert moves.ACTIONS.index(move) in moves.legal_actions(gs)
+  assert found > 0
+
+def test_signature_ignores_hidden_cards():
+  """Face down cards don't change the position's key"""
+  gs = gamestate.GameState(0, 2, 0, seed=1)
+  key = book.signature(gs)
+  flop = gs.development_cards[1][0]
+  deck = gs.development_cards[0][0]
+  flop[0], deck[0] = deck[0], flop[0]
+  assert book.signature(gs) == key
+
+def test_no_lookup_after_opening(test_book):
+  """Positions past the book's rounds are left to the decision trees"""
+  gs = gamestate.GameState(0, 1, 0, seed=0)
+  gs.turn = settings.OPENING_BOOK_ROUNDS
+  assert book.in_book(gs) is None
+  assert book.lookup(gs, test_book) is None
+
+def test_book_hit_skips_weights(test_book, monkeypatch):
+  """A book move is played without weighing any cards"""
+  monkeypatch.setattr(settings, "OPENING_BOOK", True)
+  monkeypatch.setattr(book, "_book", test_book)
+  gs = next(gs for gs in (gamestate.GameState(0, 1, 0, seed=seed) for seed in range(40))
+            if book.lookup(gs) is not None)
+  move = book.lookup(gs)
+
+  def fail(*args):
+    raise AssertionError("weights refreshed on a book hit")
+  monkeypatch.setattr(gamestate.GameState, "refresh_weights", fail)
+  monkeypatch.setattr(player, "weigh_cards", fail)
+  gs.players[0].evaluation(gs, None)
+  assert gs.players[0].tokens == list(move[1])
+
+def test_book_per_ai_type(tmp_path):
+  """The modified AI has entries of its own, which the standard AI never plays"""
+  path = str(tmp_path / "book.npy")
+  modified_book = book.build(300, ai_types=(1,), player_counts=(2,), path=path)
+  found = {0: 0, 1: 0}
+  for ai_type in found:
+    for index in range(20):
+      gs = gamestate.GameState(0, 2, ai_type, simulation.game_seed(0, index))
+      while gs.turn < settings.OPENING_BOOK_ROUNDS * 2:
+        found[ai_type] += book.lookup(gs, modified_book) is not None
+        gs.players[gs.turn % 2].evaluation(gs, None)
+  assert found[1] > 0
+  assert found[0] == 0
@@ -0,0 +1,52 @@
+import settings
+settings.TESTING_MODE = True
+
+import catalog
+import gamestate
+import numpy as np
+import pytest
+
+@pytest.fixture
+def test_catalog():
+  return catalog.load()
+
+def test_load_once(test_catalog):
+  """The catalog is parsed once and shared between games"""
+  assert catalog.load() is test_catalog
+  assert len(test_catalog.cards) == 90
+  assert len(test_catalog.nobles) == 9
+
+def test_card_ids(test_catalog):
+  """Card ids index straight back into the catalog"""
+  for id, card in enumerate(test_catalog.cards):
+    assert card.id == id
+    assert test_catalog.card(id) is card
+  assert [len(ids) for ids in test_catalog.tier_ids] == [40, 30, 20]
+
+def test_cards_shared_between_games(test_catalog):
+  """Games deal interned catalog records rather than fresh copies"""
+  game_1 = gamestate.GameState(0, 2, 0)
+  game_2 = gamestate.GameState(0, 2, 0)
+  for game in [game_1, game_2]:
+    for tier in game.development_cards[0] + game.development_cards[1]:
+      for card in tier:
+        assert test_catalog.card(card.id) is card
+    for noble in game.noble_cards[0] + game.noble_cards[1]:
+      assert test_catalog.noble(noble.id) is noble
+
+def test_card_cost(test_catalog):
+  """Cost vectors are padded with gold and cannot be modified"""
+  card = gamestate.GameState.DevelopmentCard(1, "Red", 1, [1, 2, 0, 0, 0])
+  assert list(card.cost) == [1, 2, 0, 0, 0, 0]
+  with pytest.raises(ValueError):
+    card.cost[0] = 5
+
+def test_noble_proximity(test_catalog):
+  """Noble distances and met flags match a direct comparison, and are shared by games"""
+  noble = test_catalog.noble(0)
+  for bonuses in [[0, 0, 0, 0, 0, 0], list(noble.prerequisites) + [0], [4, 4, 4, 4, 4, 0]]:
+    distance, met = catalog.noble_proximity(noble, bonuses)
+    assert distance == pytest.approx(np.linalg.norm(np.array(noble.prerequisites) - bonuses[:5]))
+    assert met == all(x >= y for x, y in zip(bonuses, noble.prerequisites))
+  assert catalog.noble_proximity(noble, [4, 4, 4, 4, 4, 0]) is catalog.noble_proximity(noble, (4, 4, 4, 4, 4, 0))
+  assert catalog.noble_proximity(noble, list(noble.prerequisites) + [0])[0] == 0
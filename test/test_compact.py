@@ -0,0 +1,70 @@
+import settings
+settings.TESTING_MODE = True
+
+import compact
+import gamestate
+import moves
+import player
+import numpy as np
+import pickle
+import pytest
+
+@pytest.fixture
+def test_gamestate():
+  return gamestate.GameState(0, 4, 0)
+
+def test_state_size(test_gamestate):
+  """A four player state should only take a few hundred bytes"""
+  state = compact.CompactState.from_gamestate(test_gamestate)
+  assert state.nbytes < 320
+  assert state.token_pool.dtype == np.int8
+
+def test_from_gamestate(test_gamestate):
+  """Packed fields should match the gamestate they were taken from"""
+  test_gamestate.players[1].tokens = [1, 0, 2, 0, 1, 1]
+  test_gamestate.players[1].add_card(test_gamestate.development_cards[1][0][1])
+  state = compact.CompactState.from_gamestate(test_gamestate)
+  assert list(state.token_pool) == [7, 7, 7, 7, 7, 5]
+  assert list(state.tokens[1]) == [1, 0, 2, 0, 1, 1]
+  assert list(state.bonuses[1]) == test_gamestate.players[1].count_wealth()[:5]
+  assert state.board[0, 1] == test_gamestate.development_cards[1][0][1].id
+  assert len(state.deck(2)) == len(test_gamestate.development_cards[0][2])
+  assert list(state.nobles).count(compact.EMPTY) == 0
+
+def test_bytes_round_trip(test_gamestate):
+  """Serialised states should rebuild to an identical record"""
+  state = compact.CompactState.from_gamestate(test_gamestate)
+  rebuilt = compact.CompactState.from_bytes(4, state.to_bytes())
+  assert rebuilt == state
+  assert hash(rebuilt) == hash(state)
+
+def test_empty_states():
+  """Blocks of states are allocated contiguously with empty card slots"""
+  states = compact.empty_states(1000, 2)
+  assert states.nbytes == 1000 * compact.state_dtype(2).itemsize
+  assert np.all(states['board'] == compact.EMPTY)
+
+def test_to_gamestate():
+  """A game rebuilt from its record plays on exactly as the original"""
+  test_gamestate = gamestate.GameState(1, 3, 2, seed=5)
+  rng = np.random.default_rng(0)
+  for _ in range(45):
+    actions = moves.legal_actions(test_gamestate)
+    moves.apply_action(test_gamestate, actions[rng.integers(len(actions))])
+  rebuilt = test_gamestate.compact().to_gamestate()
+  assert rebuilt.compact() == test_gamestate.compact()
+  assert rebuilt.dealt == test_gamestate.dealt
+  assert not isinstance(rebuilt.players[0], player.AI)
+  assert isinstance(rebuilt.players[1], player.AI)
+  for original, copy in zip(test_gamestate.players, rebuilt.players):
+    assert sorted(card.id for card in copy.cards) == sorted(card.id for card in original.cards)
+    assert copy.bonuses == original.bonuses
+    assert copy.score() == original.score()
+  assert moves.legal_actions(rebuilt) == moves.legal_actions(test_gamestate)
+
+def test_pickles_as_bytes(test_gamestate):
+  """Snapshots for other processes pickle as the record's bytes"""
+  state = test_gamestate.compact()
+  data = pickle.dumps(state)
+  assert len(data) < 2 * state.nbytes
+  assert pickle.loads(data) == state
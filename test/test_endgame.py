@@ -0,0 +1,60 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import endgame
+import expectimax
+import moves
+import pytest
+
+@pytest.fixture
+def test_gamestate():
+  """Last turn of a round, the player to move one point from victory and able to buy anything"""
+  gs = gamestate.GameState(0, 2, 1, seed=4)
+  gs.turn = 1
+  gs.players[1].points = settings.VICTORY_POINTS_REQUIRED - 1
+  gs.players[1].tokens = [4, 4, 4, 4, 4, 5]
+  return gs
+
+def test_applies(test_gamestate, monkeypatch):
+  """The solver switches on near victory, late in the round"""
+  assert endgame.applies(test_gamestate)
+  assert not endgame.applies(gamestate.GameState(0, 2, 1, seed=4))
+  monkeypatch.setattr(settings, "ENDGAME_TURNS", 1)
+  test_gamestate.turn = 0
+  assert not endgame.applies(test_gamestate)
+
+def test_forced_win(test_gamestate):
+  """Buying a card with points wins at the end of the round"""
+  action, stats = endgame.solve(test_gamestate, expectimax.TranspositionTable(1024))
+  move = moves.ACTIONS[action]
+  assert move[0] == "buy"
+  assert test_gamestate.development_cards[1][move[1]][move[2]].pointValue > 0
+  assert stats["value"] == endgame.WIN
+  assert stats["decisive"]
+
+def test_tie_break_on_cards(test_gamestate):
+  """A tie on points goes to the player with fewer cards"""
+  test_gamestate.players[1].tokens = [0, 0, 0, 0, 0, 0]
+  test_gamestate.players[1].points = settings.VICTORY_POINTS_REQUIRED
+  test_gamestate.players[0].points = settings.VICTORY_POINTS_REQUIRED
+  test_gamestate.players[0].cards = [test_gamestate.development_cards[0][0][0]]
+  assert endgame.solve(test_gamestate, expectimax.TranspositionTable(1024))[1]["value"] == endgame.WIN
+  test_gamestate.players[1].cards = test_gamestate.development_cards[0][0][1:3]
+  assert endgame.solve(test_gamestate, expectimax.TranspositionTable(1024))[1]["value"] == endgame.LOSS
+
+def test_solved_positions_are_cached(test_gamestate):
+  """Solving the same endgame again reuses the solved positions"""
+  table = expectimax.TranspositionTable(2 ** 12)
+  test_gamestate.turn = 0
+  test_gamestate.players[0].points = settings.VICTORY_POINTS_REQUIRED - 1
+  _, first = endgame.solve(test_gamestate, table)
+  _, second = endgame.solve(test_gamestate, table)
+  assert second["nodes"] < first["nodes"]
+  assert second["value"] == first["value"]
+
+def test_table_kept_within_a_game(test_gamestate):
+  """The process's table is reused by the same game, and its clones, but not by another game"""
+  table = endgame.table(test_gamestate)
+  assert endgame.table(test_gamestate.clone()) is table
+  assert endgame.table(gamestate.GameState(0, 2, 1, seed=5)) is not table
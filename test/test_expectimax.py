@@ -0,0 +1,74 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import player
+import expectimax
+import moves
+import simulation
+import mcts
+import time
+
+def test_search_is_deterministic():
+  """Searching the same position twice gives the same action and value"""
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  test_gamestate.players[0].tokens = [2, 1, 1, 0, 0, 1]
+  first = expectimax.search(test_gamestate, 2, expectimax.TranspositionTable(1024))
+  second = expectimax.search(test_gamestate, 2, expectimax.TranspositionTable(1024))
+  assert first[0] in moves.legal_actions(test_gamestate)
+  assert first[0] == second[0]
+  assert first[1]["value"] == second[1]["value"]
+  assert len(test_gamestate.move_stack) == 0
+
+def test_transpositions_are_reused():
+  """A repeated search finds its positions in the table"""
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  table = expectimax.TranspositionTable(2 ** 16)
+  _, first = expectimax.search(test_gamestate, 2, table)
+  _, second = expectimax.search(test_gamestate, 2, table)
+  assert second["nodes"] < first["nodes"]
+  assert second["value"] == first["value"]
+
+def test_table_replacement():
+  """The table keeps a fixed size, deeper entries surviving within a search"""
+  table = expectimax.TranspositionTable(6)
+  assert len(table.keys) == 8
+  table.store(3, 2, 0.5, expectimax.EXACT, 7)
+  table.store(11, 1, 0.25, expectimax.EXACT, 8)
+  assert table.probe(3) == (2, 0.5, expectimax.EXACT, 7)
+  assert table.probe(11) is None
+  table.new_search()
+  table.store(11, 1, 0.25, expectimax.EXACT, 8)
+  assert table.probe(11) == (1, 0.25, expectimax.EXACT, 8)
+  assert table.probe(3) is None
+
+def test_expectimax_game(monkeypatch):
+  """An expectimax game plays through the usual AI actions to a winner"""
+  monkeypatch.setattr(gamestate, "TESTING_MODE", False)
+  monkeypatch.setattr(player, "TESTING_MODE", False)
+  monkeypatch.setattr(settings, "EXPECTIMAX_DEPTH", 1)
+  game_summary = simulation.simulate_game(4, 2, seed=1)
+  assert game_summary.game_completed == True
+
+def test_search_deadline():
+  """A deep search returns the best move of the deepest finished search by its deadline"""
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  start = time.perf_counter()
+  action, stats = expectimax.search(test_gamestate, 3, expectimax.TranspositionTable(1024), start + 0.1)
+  assert time.perf_counter() - start < 0.3
+  assert action in moves.legal_actions(test_gamestate)
+  assert stats["value"] is not None
+
+def test_search_out_of_time():
+  """Out of time before any search, the greedy move is played"""
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  action, _ = expectimax.search(test_gamestate, 2, expectimax.TranspositionTable(1024), time.perf_counter())
+  assert action == mcts.greedy_action(test_gamestate)
+
+def test_deadline_game(monkeypatch):
+  """Games play through with a bulk simulation deadline"""
+  monkeypatch.setattr(gamestate, "TESTING_MODE", False)
+  monkeypatch.setattr(player, "TESTING_MODE", False)
+  monkeypatch.setattr(settings, "AI_DEADLINE", 0.002)
+  game_summary = simulation.simulate_game(4, 2, seed=1)
+  assert game_summary.game_completed == True
@@ -82,3 +82,93 @@ def test_increment_turn(test_gamestate):
   """Check function correctly adds 1 to turn count"""
   gamestate.GameState.increment_turn(test_gamestate, None)
   assert test_gamestate.turn == 1
+
+def test_clone():
+  """Clones share card records but changes to them do not leak back"""
+  original = gamestate.GameState(0, 2, 0)
+  original.players[0].add_card(original.development_cards[1][0][1])
+  clone = original.clone()
+
+  clone.token_pool[0] -= 1
+  clone.players[0].tokens[0] += 1
+  clone.players[0].add_card(clone.development_cards[1][1].pop(1))
+  clone.noble_cards[1].pop(0)
+  clone.turn += 1
+
+  assert original.token_pool[0] == 4
+  assert original.players[0].tokens[0] == 0
+  assert len(original.players[0].cards) == 1
+  assert len(original.development_cards[1][1]) == 5
+  assert len(original.noble_cards[1]) == 3
+  assert original.turn == 0
+  assert clone.players[0].cards[0] is original.players[0].cards[0]
+  assert clone.game_summary is not original.game_summary
+
+def state_fingerprint(gs):
+  """Everything apply_move may touch, including list order"""
+  return (
+    [list(map(int, p.tokens)) for p in gs.players],
+    [[c.id for c in p.cards] for p in gs.players],
+    [[c.id for c in p.reservations] for p in gs.players],
+    [[n.id for n in p.nobles] for p in gs.players],
+    [list(p.bonuses) for p in gs.players],
+    [p.points for p in gs.players],
+    list(map(int, gs.token_pool)),
+    [[[c.id for c in tier] for tier in cards] for cards in gs.development_cards],
+    [[n.id for n in nobles] for nobles in gs.noble_cards],
+    [c.id for c in gs.dealt],
+    gs.turn, gs.final_round, gs.noble_pending
+  )
+
+def test_apply_and_undo_move():
+  """A sequence of moves undone in reverse restores the exact starting state"""
+  gs = gamestate.GameState(0, 2, 0)
+  gs.players[0].tokens = [3, 3, 3, 3, 3, 1]
+  gs.players[1].tokens = [4, 4, 4, 4, 4, 0]
+  before = state_fingerprint(gs)
+  moves = [("take", (1, 1, 1, 0, 0, 0)), ("reserve", 0, 2), ("buy", 0, 3),
+           ("buy_reserved", 0), ("reserve", 2, 0), ("take", (0, 0, 2, 0, 0, 0)), ("pass",)]
+
+  fingerprints = []
+  for move in moves:
+    fingerprints.append(state_fingerprint(gs))
+    gs.apply_move(move)
+
+  assert gs.turn == len(moves)
+  assert len(gs.players[0].reservations) == 1 and len(gs.players[1].cards) == 1
+  assert len(gs.move_stack) == len(moves)
+
+  for fingerprint in reversed(fingerprints):
+    gs.undo_move()
+    assert state_fingerprint(gs) == fingerprint
+  assert state_fingerprint(gs) == before
+
+def test_apply_move_noble_choice():
+  """Meeting a noble's prerequisites gives the same player a noble choice"""
+  gs = gamestate.GameState(0, 2, 0)
+  noble = gs.noble_cards[1][0]
+  for i, count in enumerate(noble.prerequisites):
+    gs.players[0].bonuses[i] = count
+  gs.apply_move(("take", (1, 1, 1, 0, 0, 0)))
+  assert gs.noble_pending and gs.turn == 0
+  gs.apply_move(("noble", 0))
+  assert gs.players[0].nobles == [noble] and gs.turn == 1
+  gs.undo_move()
+  gs.undo_move()
+  assert gs.noble_cards[1][0] is noble and gs.turn == 0 and not gs.noble_pending
+
+def test_reserve_card_uses_turn_weights(monkeypatch):
+  """Classifying a reservation reads the weights taken at the start of the turn"""
+  gs = gamestate.GameState(1, 2, 0)
+  gs.refresh_weights()
+  card = gs.development_cards[1][0][1]
+  gs.players[1].w_card[card] = 1000
+
+  def recalculated(*args):
+    raise AssertionError("weights recalculated")
+
+  monkeypatch.setattr(gamestate.p.Player, "update_noble_weights", recalculated)
+  monkeypatch.setattr(gamestate.p, "weigh_cards", recalculated)
+  gs.reserve_card(0, gs.development_cards[1][0], 1, None)
+  assert gs.players[0].reservations == [card]
+  assert gs.game_summary.turn_data[0][1] == "RA"
@@ -0,0 +1,131 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import player
+import mcts
+import moves
+import simulation
+import pytest
+import pickle
+import threading
+import time
+
+@pytest.fixture
+def test_gamestate():
+  gs = gamestate.GameState(0, 2, 2, seed=3)
+  gs.players[0].tokens = [2, 1, 1, 0, 0, 1]
+  return gs
+
+def test_search_iterations(test_gamestate):
+  """The search returns a legal action after its iteration budget"""
+  action, stats = mcts.search(test_gamestate, iterations=50)
+  assert action in moves.legal_actions(test_gamestate)
+  assert stats["iterations"] == 50
+  assert stats["rate"] > 0
+
+def test_search_time_limit(test_gamestate):
+  """The search stops once its time budget is spent"""
+  _, stats = mcts.search(test_gamestate, time_limit=0.05)
+  assert stats["iterations"] > 0
+  assert stats["seconds"] < 0.5
+
+def test_search_draws_once_from_game():
+  """A search takes one seed from the game's generator, whatever its length"""
+  draws = []
+  for iterations in [10, 100]:
+    test_gamestate = gamestate.GameState(0, 2, 2, seed=7)
+    mcts.search(test_gamestate, iterations=iterations)
+    draws.append(test_gamestate.rng.random())
+  assert draws[0] == draws[1]
+
+def test_search_leaves_gamestate(test_gamestate):
+  """Searching works on a clone and leaves the game untouched"""
+  before = (test_gamestate.turn, list(test_gamestate.token_pool), list(test_gamestate.players[0].tokens),
+            [list(tier) for tier in test_gamestate.development_cards[1]])
+  mcts.search(test_gamestate, iterations=50)
+  after = (test_gamestate.turn, list(test_gamestate.token_pool), list(test_gamestate.players[0].tokens),
+           [list(tier) for tier in test_gamestate.development_cards[1]])
+  assert before == after
+  assert len(test_gamestate.move_stack) == 0
+
+def test_score_finished_game(test_gamestate):
+  """A finished game rewards only the winner"""
+  test_gamestate.players[1].points = 15
+  test_gamestate.final_round = True
+  assert mcts.score(test_gamestate) == [0.0, 1.0]
+
+def test_mcts_game(monkeypatch):
+  """An MCTS game plays through the usual AI actions to a winner"""
+  monkeypatch.setattr(gamestate, "TESTING_MODE", False)
+  monkeypatch.setattr(player, "TESTING_MODE", False)
+  monkeypatch.setattr(settings, "MCTS_ITERATIONS", 10)
+  game_summary = simulation.simulate_game(2, 2, seed=1)
+  assert game_summary.game_completed == True
+  assert all(action[0] in "BTRE" for action in game_summary.turn_data[0].values())
+
+def test_determinizer_keeps_visible_cards(test_gamestate):
+  """Samples only reorder the decks and face down cards, keeping face up cards in place"""
+  state = test_gamestate.clone()
+  hidden = [sorted(card.id for card in [flop[0]] + deck)
+            for flop, deck in zip(state.development_cards[1], state.development_cards[0])]
+  faceup = [flop[1:] for flop in state.development_cards[1]]
+  determinizer = mcts.Determinizer(state, 4, test_gamestate.rng)
+  orders = []
+  for _ in range(8):
+    determinizer.apply(state)
+    assert [flop[1:] for flop in state.development_cards[1]] == faceup
+    assert [sorted(card.id for card in [flop[0]] + deck)
+            for flop, deck in zip(state.development_cards[1], state.development_cards[0])] == hidden
+    orders.append([card.id for card in state.development_cards[0][0]])
+  assert len(set(map(tuple, orders))) > 1
+
+def test_information_set_search(test_gamestate):
+  """Searching over determinizations returns a legal action and leaves the game untouched"""
+  decks = [list(tier) for tier in test_gamestate.development_cards[0]]
+  action, stats = mcts.search(test_gamestate, iterations=100, determinizations=16)
+  assert action in moves.legal_actions(test_gamestate)
+  assert stats["iterations"] == 100
+  assert [list(tier) for tier in test_gamestate.development_cards[0]] == decks
+
+def test_information_set_game(monkeypatch):
+  """An information set search game plays through to a winner"""
+  monkeypatch.setattr(gamestate, "TESTING_MODE", False)
+  monkeypatch.setattr(player, "TESTING_MODE", False)
+  monkeypatch.setattr(settings, "MCTS_ITERATIONS", 10)
+  game_summary = simulation.simulate_game(3, 2, seed=1)
+  assert game_summary.game_completed == True
+
+def test_parallel_search(test_gamestate):
+  """Root parallel search merges the trees of several processes"""
+  action, stats = mcts.parallel_search(test_gamestate, iterations=30, workers=2)
+  assert action in moves.legal_actions(test_gamestate)
+  assert stats["trees"] == 2
+  assert stats["iterations"] == 60
+
+def test_parallel_search_time_limit(test_gamestate):
+  """Parallel search keeps to its time budget"""
+  _, stats = mcts.parallel_search(test_gamestate, time_limit=0.3, workers=2, determinizations=16)
+  assert stats["iterations"] > 0
+  assert stats["seconds"] < 0.3 + 0.1
+
+def test_parallel_search_stop(test_gamestate):
+  """A stop ends a search bound only by iterations, in this process and the workers"""
+  stop = threading.Event()
+  threading.Timer(0.2, stop.set).start()
+  start = time.perf_counter()
+  action, _ = mcts.parallel_search(test_gamestate, iterations=10 ** 9, workers=2, stop=stop)
+  assert time.perf_counter() - start < 1
+  assert action in moves.legal_actions(test_gamestate)
+
+  # The worker is free for the next search
+  start = time.perf_counter()
+  _, stats = mcts.parallel_search(test_gamestate, iterations=30, workers=2)
+  assert stats["trees"] == 2
+  assert time.perf_counter() - start < 1
+
+def test_cards_pickle_as_catalog_records(test_gamestate):
+  """Snapshots sent to workers refer to the catalog's card records"""
+  snapshot = pickle.loads(pickle.dumps(test_gamestate))
+  assert snapshot.development_cards[1][0][1] is test_gamestate.development_cards[1][0][1]
+  assert snapshot.noble_cards[1][0] is test_gamestate.noble_cards[1][0]
@@ -0,0 +1,49 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import moves
+import pytest
+import random
+
+@pytest.fixture
+def test_gamestate():
+  return gamestate.GameState(0, 2, 0)
+
+def test_action_table():
+  """Every encoded action is a small integer indexing a distinct move"""
+  assert len(moves.ACTIONS) == 66
+  assert len(set(moves.ACTIONS)) == len(moves.ACTIONS)
+
+def test_opening_actions(test_gamestate):
+  """Opening moves are token picks and reservations only"""
+  actions = moves.legal_actions(test_gamestate)
+  kinds = [moves.ACTIONS[action][0] for action in actions]
+  assert kinds.count("take") == 15
+  assert kinds.count("reserve") == 15
+  assert len(actions) == 30
+
+def test_token_limit(test_gamestate):
+  """Near the token limit only smaller picks are legal"""
+  test_gamestate.players[0].tokens = [2, 2, 2, 2, 0, 0]
+  actions = moves.legal_actions(test_gamestate)
+  takes = [moves.ACTIONS[action][1] for action in actions if moves.ACTIONS[action][0] == "take"]
+  assert all(sum(stack) == 2 for stack in takes)
+  assert len(takes) == 15
+
+def test_random_playout(test_gamestate):
+  """Random legal playouts keep tokens within limits and undo back to the start"""
+  random.seed(1)
+  start = [list(p.tokens) for p in test_gamestate.players], list(test_gamestate.token_pool)
+  played = 0
+  while not test_gamestate.final_round and played < 400:
+    actions = moves.legal_actions(test_gamestate)
+    moves.apply_action(test_gamestate, random.choice(actions))
+    played += 1
+    for p in test_gamestate.players:
+      assert min(p.tokens) >= 0 and sum(p.tokens) <= 10
+    assert min(test_gamestate.token_pool) >= 0
+  for i in range(played):
+    moves.undo_action(test_gamestate)
+  assert ([list(p.tokens) for p in test_gamestate.players], list(test_gamestate.token_pool)) == start
+  assert test_gamestate.turn == 0
@@ -37,3 +37,12 @@ def test_count_wealth(test_gamestate, test_player, test_card):
   gamestate.GameState.acquire_card(test_gamestate, 0, [test_card], 0, "board", None) 
   assert player.Player.count_wealth(test_player) == [0, 0, 0, 1, 0, 0]
 
+
+def test_add_card_updates_bonuses():
+  """Bonuses and score are maintained as cards and nobles are added"""
+  test_player = player.Player("Player 1", 0, [0, 0, 0, 0, 0, 0], [], [], [])
+  test_player.add_card(gamestate.GameState.DevelopmentCard(1, "Red", 1, [0, 0, 0, 0, 0]))
+  test_player.add_card(gamestate.GameState.DevelopmentCard(2, "Blue", 2, [0, 0, 0, 0, 0]))
+  test_player.add_noble(gamestate.GameState.NobleCard([0, 0, 0, 0, 0]))
+  assert test_player.count_wealth() == [0, 1, 0, 1, 0, 0]
+  assert test_player.score() == 6
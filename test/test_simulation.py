@@ -0,0 +1,72 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import player
+import pytest
+import traceback
+import simulation
+
+@pytest.fixture
+def full_game(monkeypatch):
+  """Headless games need the full turn cycle, which testing mode disables"""
+  monkeypatch.setattr(gamestate, "TESTING_MODE", False)
+  monkeypatch.setattr(player, "TESTING_MODE", False)
+
+@pytest.mark.parametrize("ai_type", [0, 1])
+def test_simulate_game(full_game, ai_type):
+  """Play an AI-only game without a UI and check it reaches a winner"""
+  game_summary = simulation.simulate_game(ai_type, 2, seed=1)
+  assert isinstance(game_summary, gamestate.GameState.GameSummary)
+  assert game_summary.game_completed == True
+  assert game_summary.winning_player in [1, 2]
+  assert game_summary.rounds > 0
+
+def test_play_turns_stack_depth(full_game, monkeypatch):
+  """AI turns are scheduled from a loop, so stack depth does not grow per turn"""
+  depths = []
+  evaluation = player.AI.evaluation
+
+  def record_depth(self, gamestate, UI):
+    depths.append(len(traceback.extract_stack()))
+    evaluation(self, gamestate, UI)
+
+  monkeypatch.setattr(player.AI, "evaluation", record_depth)
+  game_summary = simulation.simulate_game(0, 2, seed=1)
+  assert game_summary.game_completed == True
+  assert len(depths) > 10
+  assert min(depths) == max(depths)
+
+def test_run_games_parallel(full_game):
+  """Games played across worker processes match the same seeded games played in order"""
+  in_order = list(simulation.run_games(4, workers=1, seed=7, n_players=2))
+  parallel = list(simulation.run_games(4, workers=2, seed=7, n_players=2))
+  assert [s.turn_data for s in parallel] == [s.turn_data for s in in_order]
+  assert [s.risk_data for s in parallel] == [s.risk_data for s in in_order]
+  assert all(s.game_completed for s in parallel)
+  assert simulation.game_seed(7, 0) != simulation.game_seed(7, 1)
+
+def test_run_games_frozen(full_game, monkeypatch):
+  """A frozen executable plays its games in this process rather than relaunching itself"""
+  def no_pool(*args, **kwargs):
+    raise AssertionError("process pool started")
+  monkeypatch.setattr(simulation.sys, "frozen", True, raising=False)
+  monkeypatch.setattr(simulation, "ProcessPoolExecutor", no_pool)
+  games = list(simulation.run_games(2, workers=2, seed=7, n_players=2))
+  assert len(games) == 2
+
+def test_seeded_game_replays(full_game):
+  """A game played again from its seed makes exactly the same moves"""
+  first = simulation.simulate_game(1, 3, seed=42)
+  replay = simulation.simulate_game(1, 3, seed=first.seed)
+  assert replay.turn_data == first.turn_data
+  assert replay.risk_data == first.risk_data
+  assert replay.winning_player == first.winning_player
+
+def test_unseeded_games_record_seed():
+  """Games without a seed still record the one they were given, and deal differently"""
+  games = [gamestate.GameState(0, 2, 0) for _ in range(2)]
+  assert games[0].seed != games[1].seed
+  replay = gamestate.GameState(0, 2, 0, games[0].seed)
+  assert replay.development_cards[0] == games[0].development_cards[0]
+  assert replay.noble_cards == games[0].noble_cards
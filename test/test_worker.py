@@ -0,0 +1,159 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import moves
+import worker
+import time
+import threading
+
+class FakeRoot:
+  """Stands in for the Tk root, running after callbacks when asked"""
+  def __init__(self):
+    self.callbacks = {}
+
+  def after(self, ms, callback):
+    self.callbacks[len(self.callbacks)] = callback
+    return len(self.callbacks) - 1
+
+  def after_cancel(self, id):
+    del self.callbacks[id]
+
+  def run_pending(self):
+    callbacks = list(self.callbacks.values())
+    self.callbacks.clear()
+    for callback in callbacks:
+      callback()
+
+class FakeUI:
+  def __init__(self):
+    self.root = FakeRoot()
+    self.links_enabled = True
+    self.ai_turn = None
+    self.progress = None
+    self.ponder = None
+
+  def update_gui(self):
+    pass
+
+  def show_progress(self, string):
+    self.progress = string
+
+  def hide_progress(self):
+    self.progress = None
+
+def test_ai_turn_posts_move():
+  """A searched move is handed back through the Tk loop, the board locked meanwhile"""
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  ui = FakeUI()
+  played = []
+  turn = worker.AITurn(test_gamestate, test_gamestate.players[0], ui, played.append)
+  turn.start()
+  assert ui.links_enabled == False
+  assert ui.ai_turn is turn
+  while len(played) == 0:
+    time.sleep(0.01)
+    ui.root.run_pending()
+  assert played[0] in [moves.ACTIONS[action] for action in moves.legal_actions(test_gamestate)]
+  assert ui.links_enabled == True
+  assert ui.ai_turn is None
+  assert ui.progress is None
+
+def test_ai_turn_cancel(monkeypatch):
+  """Cancelling stops the search and its move is never played"""
+  monkeypatch.setattr(settings, "EXPECTIMAX_DEPTH", 4)
+  test_gamestate = gamestate.GameState(0, 2, 4, seed=3)
+  ui = FakeUI()
+  played = []
+  turn = worker.AITurn(test_gamestate, test_gamestate.players[0], ui, played.append)
+  turn.start()
+  turn.cancel()
+  turn.thread.join(timeout=5)
+  assert not turn.thread.is_alive()
+  ui.root.run_pending()
+  assert played == []
+
+def test_ponder_replies():
+  """A foreseen human move is answered from the cache, any other is not"""
+  test_gamestate = gamestate.GameState(1, 2, 4, seed=3)
+  test_gamestate.refresh_weights()
+  ui = FakeUI()
+  ui.ponder = None
+  ponder = worker.Ponder(test_gamestate, ui)
+  ponder.start()
+  assert ui.ponder is ponder
+  ponder.thread.join(timeout=30)
+  predicted = worker.likely_moves(test_gamestate, settings.PONDER_MOVES)
+  assert len(ponder.replies) == len(predicted)
+
+  unexpected = [action for action in moves.legal_actions(test_gamestate) if action not in predicted][0]
+  test_gamestate.apply_move(moves.ACTIONS[unexpected])
+  assert ponder.reply(test_gamestate) is None
+  test_gamestate.undo_move()
+
+  test_gamestate.apply_move(moves.ACTIONS[predicted[0]])
+  move, stats = ponder.reply(test_gamestate)
+  assert move in [moves.ACTIONS[action] for action in moves.legal_actions(test_gamestate)]
+  assert stats["nodes"] > 0
+
+def test_ponder_replaced(monkeypatch):
+  """A new ponder cancels the last one and waits for it before searching"""
+  monkeypatch.setattr(settings, "EXPECTIMAX_DEPTH", 4)
+  test_gamestate = gamestate.GameState(1, 2, 4, seed=3)
+  test_gamestate.refresh_weights()
+  ui = FakeUI()
+  first = worker.Ponder(test_gamestate, ui)
+  first.start()
+  second = worker.Ponder(test_gamestate, ui)
+  second.start()
+  assert first.stop.is_set()
+  assert ui.ponder is second
+  second.cancel()
+  second.thread.join(timeout=5)
+  assert not first.thread.is_alive()
+  assert not second.thread.is_alive()
+
+def test_ai_turn_waits_for_ponder(monkeypatch):
+  """The AI's search only starts once the stopped ponder has finished"""
+  monkeypatch.setattr(settings, "EXPECTIMAX_DEPTH", 4)
+  test_gamestate = gamestate.GameState(1, 2, 4, seed=3)
+  test_gamestate.refresh_weights()
+  ui = FakeUI()
+  ponder = worker.Ponder(test_gamestate, ui)
+  ponder.start()
+
+  ai = test_gamestate.players[1]
+  pondering = []
+  def record(*args):
+    pondering.append(ponder.thread.is_alive())
+    return None
+  monkeypatch.setattr(ai, "choose_move", record)
+  played = []
+  turn = worker.AITurn(test_gamestate, ai, ui, played.append, ponder)
+  turn.start()
+  turn.thread.join(timeout=5)
+  assert pondering == [False]
+  assert ponder.stop.is_set()
+
+def test_ponder_winding_down():
+  """A stopped ponder still searching is kept for the next search, without its replies"""
+  test_gamestate = gamestate.GameState(1, 2, 4, seed=3)
+  test_gamestate.refresh_weights()
+  ponder = worker.Ponder(test_gamestate, FakeUI())
+  release = threading.Event()
+  ponder.thread = threading.Thread(target=release.wait, daemon=True)
+  ponder.thread.start()
+  ponder.replies[0] = ("pass", {})
+  ponder.cancel()
+  assert ponder.winding_down() is ponder
+  assert ponder.replies == {}
+  release.set()
+  ponder.thread.join(timeout=5)
+  assert ponder.winding_down() is None
+
+def test_likely_moves_prefer_buys():
+  """Affordable cards are expected to be bought before tokens are taken"""
+  test_gamestate = gamestate.GameState(1, 2, 4, seed=3)
+  test_gamestate.players[0].tokens = [4, 4, 4, 4, 4, 0]
+  likely = worker.likely_moves(test_gamestate, 3)
+  assert all(moves.ACTIONS[action][0] == "buy" for action in likely)
@@ -0,0 +1,38 @@
+import settings
+settings.TESTING_MODE = True
+
+import gamestate
+import moves
+import zobrist
+import numpy as np
+
+def test_incremental_hash_matches_full_hash():
+  """Hashes updated move by move match hashes of the positions from scratch"""
+  test_gamestate = gamestate.GameState(0, 3, 0, seed=5)
+  rng = np.random.default_rng(0)
+  hashes = [zobrist.position(test_gamestate)]
+  for _ in range(60):
+    actions = moves.legal_actions(test_gamestate)
+    if len(actions) == 0:
+      break
+    moves.apply_action(test_gamestate, actions[int(rng.integers(len(actions)))])
+    hashes.append(zobrist.update(hashes[-1], test_gamestate))
+    assert hashes[-1] == zobrist.position(test_gamestate)
+
+  # Undoing returns to the earlier hashes
+  while len(test_gamestate.move_stack) > 0:
+    test_gamestate.undo_move()
+    hashes.pop()
+    assert zobrist.position(test_gamestate) == hashes[-1]
+
+def test_hash_ignores_hidden_cards():
+  """Reordering the decks and face down cards leaves the hash unchanged"""
+  test_gamestate = gamestate.GameState(0, 2, 0, seed=5)
+  h = zobrist.position(test_gamestate)
+  deck = test_gamestate.development_cards[0][0]
+  flop = test_gamestate.development_cards[1][0]
+  deck.reverse()
+  flop[0], deck[0] = deck[0], flop[0]
+  assert zobrist.position(test_gamestate) == h
+  flop[1], deck[0] = deck[0], flop[1]
+  assert zobrist.position(test_gamestate) != h
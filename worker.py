@@ -0,0 +1,185 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+worker.py - Runs AI searches on a worker thread, posting moves back to the Tk loop
+"""
+
+import queue, threading, time, traceback
+import settings, moves, mcts, zobrist
+import player as p
+import numpy as np
+
+# Milliseconds between checks for a finished search
+POLL_INTERVAL = 20
+# Seconds to wait for a stopped ponder search to wind down
+JOIN_TIMEOUT = 0.5
+
+
+class AITurn:
+    """One AI decision made on a worker thread while the Tk loop keeps running
+
+    The Tk loop polls for the move with root.after and hands it to on_done, so
+    all game and widget updates stay on the Tk thread.
+    """
+
+    def __init__(self, gamestate, player, UI, on_done, ponder=None):
+        self.gamestate = gamestate
+        self.player = player
+        self.UI = UI
+        self.on_done = on_done
+        # Stopped pondering still to wind down before the search starts
+        self.ponder = ponder
+        self.moves = queue.Queue()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.poll_id = None
+
+    def start(self):
+        self.deadline = None
+        if settings.AI_DEADLINE is not None:
+            self.deadline = time.perf_counter() + settings.AI_DEADLINE
+        self.name = "Player " + str(self.gamestate.turn % len(self.gamestate.players) + 1) + " (AI)"
+
+        # Keep the human's hands off the board until the move is played
+        self.UI.ai_turn = self
+        self.UI.links_enabled = False
+        self.UI.update_gui()
+
+        self.thread.start()
+        self.poll_id = self.UI.root.after(POLL_INTERVAL, self.poll)
+
+    def run(self):
+        """Worker thread - search and post the move"""
+        if self.ponder is not None:
+            self.ponder.cancel()
+            self.ponder.thread.join()
+        try:
+            move = self.player.choose_move(self.gamestate, self.deadline, self.stop)
+        except Exception:
+            # Fall back on the decision tree rather than leaving the game waiting
+            traceback.print_exc()
+            move = None
+        self.moves.put(move)
+
+    def poll(self):
+        """Tk thread - play the move once posted, otherwise check again shortly"""
+        if self.stop.is_set():
+            return
+        try:
+            move = self.moves.get_nowait()
+        except queue.Empty:
+            self.UI.show_progress(self.name + " is thinking...")
+            self.poll_id = self.UI.root.after(POLL_INTERVAL, self.poll)
+            return
+        self.poll_id = None
+        self.UI.ai_turn = None
+        self.UI.links_enabled = True
+        self.UI.hide_progress()
+        self.on_done(move)
+
+    def cancel(self):
+        """Stops the search and drops its move, e.g. when the game is restarted"""
+        self.stop.set()
+        if self.poll_id is not None:
+            self.UI.root.after_cancel(self.poll_id)
+            self.poll_id = None
+
+
+class Ponder:
+    """Searches the AI's replies to the human's likely moves while the human thinks
+
+    Replies are cached by the Zobrist key of the position after the human's move,
+    so a correct guess is answered without searching. The base position is cloned
+    on the Tk thread when pondering starts, before the human changes anything.
+    """
+
+    def __init__(self, gamestate, UI):
+        self.state = gamestate.clone()
+        # Pondering draws from its own generator, leaving the game's sequence alone
+        self.state.rng = np.random.default_rng()
+        self.UI = UI
+        self.replies = {}
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.previous = None
+
+    def start(self):
+        # Another human moved first, so their ponder is no use
+        self.previous = self.UI.ponder
+        if self.previous is not None:
+            self.previous.cancel()
+        self.UI.ponder = self
+        self.thread.start()
+
+    def run(self):
+        """Worker thread - search a reply to each likely move in turn"""
+        if self.previous is not None:
+            self.previous.thread.join()
+            self.previous = None
+        deadline = None
+        for action in likely_moves(self.state, settings.PONDER_MOVES):
+            state = self.state.clone()
+            moves.apply_action(state, action)
+            # The human's noble choice can't be known, so guess the first
+            while state.noble_pending:
+                moves.apply_action(state, moves.legal_actions(state)[0])
+
+            player = state.players[state.turn % len(state.players)]
+            if state.final_round or not isinstance(player, p.AI) or not player.searches(state):
+                continue
+            if settings.AI_DEADLINE is not None:
+                deadline = time.perf_counter() + settings.AI_DEADLINE
+            try:
+                move = player.choose_move(state, deadline, self.stop)
+            except Exception:
+                traceback.print_exc()
+                return
+
+            # A search cut short by the human's move is not as strong as a fresh one
+            if self.stop.is_set():
+                return
+            self.replies[key(state)] = (move, player.search_stats)
+
+    def reply(self, gamestate):
+        """Stops pondering and returns the reply cached for this position, if any
+
+        The result is a (move, search statistics) pair, or None if the guess was wrong.
+        """
+        self.stop.set()
+        # Searches check the stop event often, so this is quick. A search that has
+        # not wound down by then is waited for by the next search
+        self.thread.join(JOIN_TIMEOUT)
+        return self.replies.get(key(gamestate))
+
+    def cancel(self):
+        self.stop.set()
+
+    def winding_down(self):
+        """This ponder if its stopped search is still running, for the next search to
+        wait for, or None
+
+        Its replies are for positions already played, so it gives none again.
+        """
+        if not self.thread.is_alive():
+            return None
+        self.replies = {}
+        return self
+
+
+def key(gamestate):
+    return zobrist.key(gamestate, zobrist.position(gamestate))
+
+
+def likely_moves(gamestate, n):
+    """The n moves a human is most likely to make - buying the highest scoring cards,
+    then picking up the tokens their weights favour"""
+    player = gamestate.players[gamestate.turn % len(gamestate.players)]
+    actions = moves.legal_actions(gamestate)
+    w_token = list(player.w_token.values()) if len(player.w_token) > 0 else [1, 1, 1, 1, 1]
+
+    buys = [action for action in actions if action in mcts.BUY_ACTIONS]
+    buys.sort(key=lambda action: -mcts.card_for(gamestate, action).pointValue)
+    takes = [action for action in actions if action in mcts.TAKE_ACTIONS]
+    takes.sort(key=lambda action: -sum(x * w for x, w in zip(moves.ACTIONS[action][1], w_token)))
+    return (buys + takes)[:n]
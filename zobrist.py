@@ -0,0 +1,110 @@
+"""
+COM3610 - Dissertation Project
+aca18cjb, (c) Chris Berisford 2021
+
+zobrist.py - Zobrist hashing of the public parts of a position, updated move by move
+"""
+
+import numpy as np
+
+MAX_PLAYERS = 4
+N_CARDS = 90
+N_NOBLES = 10
+
+# Keys come from a fixed seed so hashes agree between processes and runs
+_keys = np.random.default_rng(3610)
+
+
+def _table(*shape):
+    return _keys.integers(0, 2 ** 64, size=shape, dtype=np.uint64).tolist()
+
+
+POOL = _table(6, 11)
+TOKENS = _table(MAX_PLAYERS, 6, 11)
+BONUSES = _table(MAX_PLAYERS, 5, N_CARDS // 5 + 1)
+POINTS = _table(MAX_PLAYERS, 64)
+RESERVED = _table(MAX_PLAYERS, N_CARDS)
+FACEUP = _table(N_CARDS)
+NOBLES = _table(N_NOBLES)
+MOVER = _table(MAX_PLAYERS)
+SEARCHER = _table(MAX_PLAYERS)
+NOBLE_PENDING, FINAL_ROUND = _table(2)
+
+
+def board_hash(flop):
+    """Hash of the face up cards of one tier, slot 0 being face down"""
+    h = 0
+    for card in flop[1:]:
+        h ^= FACEUP[card.id]
+    return h
+
+
+def position(gamestate):
+    """Hash of a position from scratch"""
+    h = 0
+    for gem, count in enumerate(gamestate.token_pool):
+        h ^= POOL[gem][count]
+    for p, player in enumerate(gamestate.players):
+        for gem in range(6):
+            h ^= TOKENS[p][gem][player.tokens[gem]]
+        for gem in range(5):
+            h ^= BONUSES[p][gem][player.bonuses[gem]]
+        h ^= POINTS[p][player.points]
+        for card in player.reservations:
+            h ^= RESERVED[p][card.id]
+    for flop in gamestate.development_cards[1]:
+        h ^= board_hash(flop)
+    for noble in gamestate.noble_cards[1]:
+        h ^= NOBLES[noble.id]
+    return h
+
+
+def update(h, gamestate):
+    """Hash after the last move on the gamestate's move stack, given the hash before it"""
+    move, p, tokens, card, refilled, _, _ = gamestate.move_stack[-1]
+    player = gamestate.players[p]
+    kind = move[0]
+
+    # Step 1 - Tokens moved between the player and the pool
+    if tokens is not None:
+        for gem in range(6):
+            if tokens[gem] != 0:
+                held = player.tokens[gem]
+                pooled = gamestate.token_pool[gem]
+                h ^= TOKENS[p][gem][held - tokens[gem]] ^ TOKENS[p][gem][held]
+                h ^= POOL[gem][pooled + tokens[gem]] ^ POOL[gem][pooled]
+
+    # Step 2 - Cards leaving the board
+    if kind == "buy" or kind == "reserve":
+        flop = gamestate.development_cards[1][move[1]]
+        slot = move[2]
+        if refilled:
+            if slot > 0:
+                h ^= FACEUP[card.id] ^ FACEUP[flop[slot].id]
+        else:
+            # The rest of the tier shifts down a slot
+            h ^= board_hash(flop[:slot] + [card] + flop[slot:]) ^ board_hash(flop)
+
+    # Step 3 - Cards and nobles gained by the player
+    if kind == "reserve":
+        h ^= RESERVED[p][card.id]
+    elif kind == "buy" or kind == "buy_reserved":
+        if kind == "buy_reserved":
+            h ^= RESERVED[p][card.id]
+        bonus = player.bonuses[card.gem]
+        h ^= BONUSES[p][card.gem][bonus - 1] ^ BONUSES[p][card.gem][bonus]
+        h ^= POINTS[p][player.points - card.pointValue] ^ POINTS[p][player.points]
+    elif kind == "noble":
+        h ^= NOBLES[card.id]
+        h ^= POINTS[p][player.points - 3] ^ POINTS[p][player.points]
+    return h
+
+
+def key(gamestate, h):
+    """Transposition key of a position hash, adding whose move it is and the game phase"""
+    h ^= MOVER[gamestate.turn % len(gamestate.players)]
+    if gamestate.noble_pending:
+        h ^= NOBLE_PENDING
+    if gamestate.final_round:
+        h ^= FINAL_ROUND
+    return h